@@ -0,0 +1,287 @@
+"""Benchmarks du bot RPG.
+
+Chaque benchmark renvoie une liste de mesures {"benchmark", "case", "ns_per_call"}
+qui peut être écrite en JSON pour comparer deux commits :
+
+    python benchmarks.py --only levels --json bench.json
+    python benchmarks.py --only database --sizes 10000,100000,1000000 --json apres.json --compare avant.json
+
+Les bases du benchmark `database` ont le schéma de discord_rpg.db. Elles sont
+générées une fois par taille et par graine dans --db-dir, puis copiées avant
+chaque série de mesures pour que les écritures ne s'accumulent pas.
+"""
+
+import os
+
+# Le module du bot ouvre sa base à l'import : une base en mémoire suffit ici
+os.environ.setdefault('RPG_DB_PATH', ':memory:')
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import shutil
+import tempfile
+import timeit
+from typing import Callable, Dict, List, Optional
+
+from discord_rpg_bot_complet import (
+    AsyncDatabase, Character, CombatSession, CombatSystem, Database, LeaderboardService, ObjectifVictoire,
+    Skill, SkillCategory, Talent, LEADERBOARD_DEPTH, build_combat_embed
+)
+from simulation import POLICIES, random_character, simulate_combat
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+CHARACTERS_PER_OWNER = 5
+SKILLS_PER_CHARACTER = 2
+SAMPLED_KEYS = 1000  # Personnages tirés au hasard pour les lectures, parcourus en boucle
+
+BENCHMARKS: Dict[str, Callable[[argparse.Namespace], List[Dict]]] = {}
+
+def benchmark(name: str):
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+def measure(func: Callable, number: Optional[int] = 10000, repeat: int = 5) -> float:
+    """Meilleur temps par appel, en nanosecondes (number=None : choisi pour durer au moins 0,2 s)"""
+    if number is None:
+        number = timeit.Timer(func).autorange()[0]
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1e9
+
+def result(name: str, case: str, ns_per_call: float) -> Dict:
+    return {"benchmark": name, "case": case, "ns_per_call": round(ns_per_call, 1)}
+
+@benchmark("levels")
+def bench_levels(options: argparse.Namespace) -> List[Dict]:
+    """Le coût de get_level_threshold et level_up doit rester constant quand le niveau augmente"""
+    results = []
+    for level in (1, 10, 100, 1000, 10000):
+        character = Character(name="Bench", owner_id=0, talent=Talent.FORTERESSE, level=level)
+        results.append(result("levels", f"get_level_threshold niveau {level}",
+                              measure(character.get_level_threshold)))
+
+        # Gain d'XP couvrant 50 niveaux d'un coup
+        experience = Character.cumulative_experience(level + 50) - Character.cumulative_experience(level)
+
+        def grant():
+            character.level = level
+            character.experience = experience
+            character.level_up()
+
+        results.append(result("levels", f"level_up +50 niveaux depuis {level}", measure(grant)))
+    return results
+
+# Base de données
+def seed_database(path: str, characters: int, seed: int):
+    """Créer une base au schéma du bot contenant `characters` personnages reproductibles"""
+    rng = random.Random(seed)
+    talents = [talent.value for talent in Talent]
+    categories = [category.value for category in SkillCategory]
+
+    database = Database(path)
+    conn = database.conn
+    with conn:
+        for start in range(0, characters, 10_000):
+            ids = range(start + 1, min(characters, start + 10_000) + 1)
+            conn.executemany(
+                "INSERT INTO characters (id, name, owner_id, hp, max_hp, power_gauge, talent, level, experience) "
+                "VALUES (?, ?, ?, 1000, 1000, 100.0, ?, ?, ?)",
+                [(char_id, f"Perso {char_id}", char_id // CHARACTERS_PER_OWNER + 1, rng.choice(talents),
+                  rng.randint(1, 100), rng.randint(0, 500_000)) for char_id in ids]
+            )
+            conn.executemany(
+                "INSERT INTO skills (character_id, name, effect, category) VALUES (?, ?, ?, ?)",
+                [(char_id, f"Compétence {i + 1}", "Effet de test", rng.choice(categories))
+                 for char_id in ids for i in range(SKILLS_PER_CHARACTER)]
+            )
+    database.close()
+
+def seeded_database(db_dir: str, characters: int, seed: int) -> str:
+    """Chemin d'une copie de travail de la base générée pour cette taille (générée au premier appel)"""
+    template = os.path.join(db_dir, f"bench-{characters}-{seed}.db")
+    if not os.path.exists(template):
+        print(f"🌱 Génération de {characters:,} personnages dans {template}...")
+        seed_database(template + ".tmp", characters, seed)
+        os.replace(template + ".tmp", template)
+
+    working = os.path.join(db_dir, f"bench-{characters}-{seed}-travail.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(working + suffix):
+            os.remove(working + suffix)
+    shutil.copyfile(template, working)
+    return working
+
+def sample_keys(characters: int, rng: random.Random) -> List[tuple]:
+    """(nom, propriétaire) de personnages existants"""
+    return [(f"Perso {char_id}", char_id // CHARACTERS_PER_OWNER + 1)
+            for char_id in (rng.randint(1, characters) for _ in range(SAMPLED_KEYS))]
+
+@benchmark("database")
+def bench_database(options: argparse.Namespace) -> List[Dict]:
+    """Requêtes de Database et pages de /classement selon le nombre de personnages en base"""
+    results = []
+    for size in options.sizes:
+        path = seeded_database(options.db_dir, size, options.seed)
+        database = Database(path)
+        keys = sample_keys(size, random.Random(options.seed))
+        label = f"{size:,} persos"
+
+        lookups = itertools.cycle(keys)
+        results.append(result("database", f"get_character ({label})",
+                              measure(lambda: database.get_character(*next(lookups)), number=None)))
+
+        owners = itertools.cycle([owner_id for _, owner_id in keys])
+        results.append(result("database", f"get_all_characters ({label})",
+                              measure(lambda: database.get_all_characters(next(owners)), number=None)))
+
+        characters = [database.get_character(*key) for key in keys[:100]]
+        updates = itertools.cycle(characters)
+
+        def update():
+            character = next(updates)
+            character.experience += 1
+            database.update_character(character)
+
+        results.append(result("database", f"update_character ({label})", measure(update, number=None)))
+
+        counter = itertools.count()
+
+        def save():
+            index = next(counter)
+            skills = [Skill(name=f"Compétence {i + 1}", effect="Effet de test", category=SkillCategory.ATTAQUE)
+                      for i in range(SKILLS_PER_CHARACTER)]
+            database.save_character(Character(name=f"Nouveau {index}", owner_id=0, talent=Talent.FORTERESSE,
+                                              skills=skills))
+
+        results.append(result("database", f"save_character ({label})", measure(save, number=None)))
+
+        for critere in LeaderboardService.CRITERIA:
+            results.append(result("database", f"get_leaderboard {critere} ({label})",
+                                  measure(lambda: database.get_leaderboard(critere, LEADERBOARD_DEPTH + 1),
+                                          number=None)))
+        database.close()
+
+        results.extend(bench_leaderboard_service(path, label))
+    return results
+
+def bench_leaderboard_service(path: str, label: str) -> List[Dict]:
+    """Chargement des classements au démarrage et pages servies par /classement"""
+    loop = asyncio.new_event_loop()
+    database = AsyncDatabase(path)
+    try:
+        service = LeaderboardService(database)
+        results = [result("database", f"/classement chargement ({label})", measure(
+            lambda: loop.run_until_complete(service.load(force=True)), number=1, repeat=3))]
+
+        pages = itertools.cycle(range(1, 11))
+        talent = Talent.FORTERESSE.value
+        for critere in LeaderboardService.CRITERIA:
+            results.append(result("database", f"/classement page {critere} ({label})", measure(
+                lambda: loop.run_until_complete(service.get_page(critere, next(pages))), number=None)))
+        results.append(result("database", f"/classement page talent ({label})", measure(
+            lambda: loop.run_until_complete(service.get_page("niveau", next(pages), talent)), number=None)))
+        return results
+    finally:
+        database.close()
+        loop.close()
+
+# Combat
+def bench_session(rng: random.Random) -> CombatSession:
+    session = CombatSession(1, 2, 0, "Joueur 1", "Joueur 2")
+    session.player1_character = random_character(1, rng)
+    session.player2_character = random_character(2, rng)
+    session.prepare_combat()
+    session.player1_objective = ObjectifVictoire.KO
+    session.player2_objective = ObjectifVictoire.KO
+    session.current_turn = 1
+    session.turn_count = 1
+    session.combat_started = True
+    return session
+
+@benchmark("combat")
+def bench_combat(options: argparse.Namespace) -> List[Dict]:
+    """Boucle de tour (dégâts, fin de tour, conditions de victoire) et duels complets"""
+    rng = random.Random(options.seed)
+    engine = CombatSystem()
+    session = bench_session(rng)
+    attacker, defender = session.fighters
+
+    def turn():
+        defender.hp = defender.max_hp  # Le duel ne se termine jamais
+        engine.calculate_damage(attacker, defender)
+        engine.process_turn_end(attacker)
+        engine.check_victory_conditions(session)
+
+    results = [result("combat", "calculate_damage", measure(lambda: engine.calculate_damage(attacker, defender))),
+               result("combat", "tour (dégâts, fin de tour, victoire)", measure(turn))]
+
+    for policy_name, policy in sorted(POLICIES.items()):
+        def duel():
+            simulate_combat(random_character(1, rng), random_character(2, rng),
+                            ObjectifVictoire.KO, ObjectifVictoire.KO, policy, rng)
+
+        results.append(result("combat", f"duel complet ({policy_name})", measure(duel, number=None)))
+    return results
+
+@benchmark("embeds")
+def bench_embeds(options: argparse.Namespace) -> List[Dict]:
+    """Construction de l'embed de statut du combat et sérialisation pour l'API"""
+    session = bench_session(random.Random(options.seed))
+    session.fighters[0].bloodlust_turns = 2
+    session.fighters[1].defense_cooldown = 1
+
+    return [
+        result("embeds", "build_combat_embed", measure(lambda: build_combat_embed(session))),
+        result("embeds", "build_combat_embed + to_dict", measure(lambda: build_combat_embed(session).to_dict())),
+        result("embeds", "build_combat_embed + JSON", measure(
+            lambda: json.dumps(build_combat_embed(session).to_dict(), ensure_ascii=False))),
+    ]
+
+def compare(results: List[Dict], baseline_path: str):
+    """Afficher l'écart de chaque mesure avec celles d'un précédent --json"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(m["benchmark"], m["case"]): m["ns_per_call"] for m in json.load(f)}
+
+    print(f"\n📊 Comparaison avec {baseline_path}")
+    for measurement in results:
+        before = baseline.get((measurement["benchmark"], measurement["case"]))
+        if before:
+            ratio = measurement["ns_per_call"] / before
+            print(f"{measurement['benchmark']:<10} {measurement['case']:<50} {before:>14,.1f} → "
+                  f"{measurement['ns_per_call']:>14,.1f} ns  x{ratio:.2f}")
+
+def parse_sizes(value: str) -> List[int]:
+    return [int(size) for size in value.split(",") if size]
+
+def main():
+    parser = argparse.ArgumentParser(description="Mesurer les performances du bot RPG")
+    parser.add_argument("--only", action="append", choices=sorted(BENCHMARKS),
+                        help="Benchmark à lancer (répétable, défaut : tous)")
+    parser.add_argument("--json", help="Écrire les mesures dans ce fichier JSON")
+    parser.add_argument("--compare", help="Fichier JSON d'une exécution précédente à comparer")
+    parser.add_argument("--sizes", type=parse_sizes, default=list(DEFAULT_SIZES),
+                        help="Nombres de personnages en base, séparés par des virgules")
+    parser.add_argument("--db-dir", default=os.path.join(tempfile.gettempdir(), "rpg-benchmarks"),
+                        help="Répertoire des bases générées, réutilisées d'une exécution à l'autre")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    os.makedirs(args.db_dir, exist_ok=True)
+
+    results = []
+    for name in args.only or sorted(BENCHMARKS):
+        for measurement in BENCHMARKS[name](args):
+            print(f"{measurement['benchmark']:<10} {measurement['case']:<50} {measurement['ns_per_call']:>14,.1f} ns")
+            results.append(measurement)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,868 @@
+"""Mode multi-processus : un processus frontal et N workers de combat partitionnés par canal.
+
+Le frontal garde la connexion Discord, les personnages, le classement et la
+base de données, dont il est le seul écrivain. Chaque interaction de combat
+(/defier, /choisir_personnage, /competence et les composants des messages de
+combat) est routée vers le worker worker_for(channel_id, N), qui exécute les
+commandes du bot sur ses propres sessions. Les workers appellent le frontal
+par RPC pour lire ou écrire des personnages et pour répondre sur Discord.
+
+La partition ne dépend que de l'identifiant du canal et du nombre de workers :
+au redémarrage, chaque worker reprend depuis le journal les combats des canaux
+qui lui reviennent.
+
+    python cluster.py --workers 4                          # connecté à Discord
+    python cluster.py --workers 4 --fake --duels 200       # sans connexion
+"""
+
+import argparse
+import asyncio
+import itertools
+import multiprocessing
+import os
+import random
+import re
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+# Commandes slash exécutées par les workers ; les autres restent dans le frontal
+ROUTED_COMMANDS = ("defier", "choisir_personnage", "competence")
+INTERACTION_LIFETIME = 15 * 60  # Durée de validité d'un jeton d'interaction Discord
+
+# Méthodes des services du frontal accessibles aux workers.
+# Les méthodes synchrones du bot sont des notifications : le worker n'attend pas de réponse.
+RPC_METHODS = {
+    "db": {"has_any_character", "append_combat_snapshot", "delete_combat_snapshots",
+           "get_latest_combat_snapshots"},
+    "character_cache": {"get_character", "update_progress"},
+    "leaderboard": {"update"},
+    "user_directory": {"resolve"},
+    "character_names": {"resolve"},
+    "discord": {"respond", "defer", "followup", "send", "edit"},
+    "players": {"engage", "release"},
+    "messages": {"untrack"},
+}
+NOTIFICATIONS = {
+    "character_cache": {"update_progress"},
+    "leaderboard": {"update"},
+    "players": {"engage", "release"},
+    "messages": {"untrack"},
+}
+
+def worker_for(channel_id: int, worker_count: int) -> int:
+    """Worker propriétaire d'un canal : identique dans tous les processus et d'un démarrage à l'autre"""
+    return zlib.crc32(channel_id.to_bytes(8, "little")) % worker_count
+
+@dataclass
+class InteractionEvent:
+    """Interaction Discord réduite à ce dont un worker a besoin, transmissible entre processus"""
+    interaction_id: int
+    kind: str  # "commande" ou "composant"
+    channel_id: int
+    user_id: int
+    user_name: str
+    name: str = ""  # Nom de la commande
+    options: Dict = field(default_factory=dict)  # Un membre est transmis comme {"id", "display_name", "bot"}
+    message_id: Optional[int] = None  # Message portant le composant
+    custom_id: str = ""
+    values: List[str] = field(default_factory=list)
+
+# ========== WORKER ==========
+
+class RelayError(Exception):
+    pass
+
+class _RelayResponse:
+    """Réponse minimale pour reconstruire une HTTPException levée dans le frontal"""
+
+    def __init__(self, status: int, reason: str):
+        self.status = status
+        self.reason = reason
+
+class RemoteService:
+    """Service du frontal vu depuis un worker : chaque méthode devient un appel RPC"""
+
+    def __init__(self, worker: "CombatWorker", target: str):
+        self._worker = worker
+        self._target = target
+
+    def __getattr__(self, method: str):
+        if method not in RPC_METHODS[self._target]:
+            raise AttributeError(f"{self._target}.{method} n'est pas accessible depuis un worker")
+        if method in NOTIFICATIONS.get(self._target, ()):
+            return lambda *args: self._worker.notify(self._target, method, *args)
+        return lambda *args, **kwargs: self._worker.call(self._target, method, *args, **kwargs)
+
+class RemoteNameIndex:
+    """Index des noms du frontal vu depuis un worker.
+
+    Le worker n'a pas de base : son propre index serait vide et refuserait
+    tous les noms. Les références de noms trop longs sont résolues par le
+    frontal, et l'existence d'un personnage est laissée au cache du frontal.
+    """
+
+    def __init__(self, worker: "CombatWorker", rpg):
+        self._remote = RemoteService(worker, "character_names")
+        self._rpg = rpg
+
+    async def resolve(self, owner_id: int, value: str) -> str:
+        if not self._rpg.is_choice_reference(value):
+            return value
+        return await self._remote.resolve(owner_id, value)
+
+    def may_exist(self, owner_id: int, name: str) -> bool:
+        return True
+
+def serialize(content=None, embed=None, embeds=None, view=None, ephemeral=False, clear_view=False) -> Dict:
+    """Corps d'un message Discord au format de l'API"""
+    payload = {}
+    if content is not None:
+        payload["content"] = str(content)
+    if embed is not None:
+        embeds = [embed]
+    if embeds:
+        payload["embeds"] = [e.to_dict() for e in embeds]
+    if view is not None:
+        payload["components"] = view.to_components()
+    elif clear_view:
+        payload["components"] = []
+    if ephemeral:
+        payload["flags"] = 64
+    return payload
+
+class RelayUser:
+    def __init__(self, user_id: int, display_name: str, bot: bool = False):
+        self.id = user_id
+        self.display_name = display_name
+        self.name = display_name
+        self.bot = bot
+
+    @property
+    def mention(self) -> str:
+        return f"<@{self.id}>"
+
+    def __eq__(self, other) -> bool:
+        return getattr(other, "id", None) == self.id
+
+    def __hash__(self) -> int:
+        return hash(self.id)
+
+class RelayMessage:
+    def __init__(self, channel: "RelayChannel", message_id: int):
+        self.channel = channel
+        self.id = message_id
+
+    async def edit(self, content=..., *, embed=None, embeds=None, view=...):
+        # Comme Message.edit : None efface le texte, un argument absent le conserve
+        content = None if content is ... else (content or "")
+        clear_view = view is None
+        payload = serialize(content, embed, embeds, None if view is ... else view, clear_view=clear_view)
+        await self.channel.worker.call("discord", "edit", self.channel.id, self.id, payload)
+        self.channel.worker.attach_view(self.id, view)
+        return self
+
+class RelayChannel:
+    """Canal vu depuis un worker : les envois passent par le frontal"""
+
+    def __init__(self, worker: "CombatWorker", channel_id: int):
+        self.worker = worker
+        self.id = channel_id
+
+    @property
+    def mention(self) -> str:
+        return f"<#{self.id}>"
+
+    async def send(self, content=None, *, embed=None, embeds=None, view=None):
+        message_id = await self.worker.call("discord", "send", self.id, serialize(content, embed, embeds, view))
+        self.worker.attach_view(message_id, view)
+        return RelayMessage(self, message_id)
+
+    def get_partial_message(self, message_id: int) -> RelayMessage:
+        return RelayMessage(self, message_id)
+
+class RelayFollowup:
+    def __init__(self, relay: "RelayInteraction"):
+        self._relay = relay
+
+    async def send(self, content=None, *, embed=None, embeds=None, view=None, ephemeral=False):
+        relay = self._relay
+        payload = serialize(content, embed, embeds, view, ephemeral)
+        message_id = await relay.worker.call("discord", "followup", relay.event.interaction_id, payload)
+        relay.worker.attach_view(message_id, view)
+        return RelayMessage(relay.channel, message_id)
+
+class RelayResponse:
+    def __init__(self, relay: "RelayInteraction"):
+        self._relay = relay
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def send_message(self, content=None, *, embed=None, embeds=None, view=None, ephemeral=False):
+        relay = self._relay
+        self._done = True
+        await relay.worker.call("discord", "respond", relay.event.interaction_id,
+                                serialize(content, embed, embeds, view, ephemeral))
+        # Une réponse initiale n'a pas d'identifiant de message : ses composants restent inertes
+        if view is not None:
+            view.stop()
+
+    async def defer(self, ephemeral: bool = False):
+        self._done = True
+        await self._relay.worker.call("discord", "defer", self._relay.event.interaction_id, ephemeral)
+
+class RelayInteraction:
+    """Remplace l'Interaction d'un composant et l'ApplicationContext d'une commande dans un worker"""
+
+    def __init__(self, worker: "CombatWorker", event: InteractionEvent):
+        self.worker = worker
+        self.event = event
+        self.id = event.interaction_id
+        self.user = self.author = RelayUser(event.user_id, event.user_name)
+        self.channel = RelayChannel(worker, event.channel_id)
+        self.guild = None
+        self.data = {"custom_id": event.custom_id, "values": event.values} if event.kind == "composant" else {}
+        self.response = RelayResponse(self)
+        self.followup = RelayFollowup(self)
+
+    async def respond(self, content=None, *, embed=None, embeds=None, view=None, ephemeral=False):
+        if self.response.is_done():
+            return await self.followup.send(content, embed=embed, embeds=embeds, view=view, ephemeral=ephemeral)
+        return await self.response.send_message(content, embed=embed, embeds=embeds, view=view, ephemeral=ephemeral)
+
+    async def defer(self, ephemeral: bool = False):
+        await self.response.defer(ephemeral)
+
+class CombatWorker:
+    """Processus de combat : exécute les commandes du bot sur les sessions de ses canaux"""
+
+    def __init__(self, index: int, worker_count: int, inbox, outbox, throttle: bool = True):
+        self.index = index
+        self.worker_count = worker_count
+        self.inbox = inbox
+        self.outbox = outbox
+        self.throttle = throttle
+        self._calls: Dict[int, asyncio.Future] = {}
+        self._call_ids = itertools.count()
+        self._views: Dict[int, object] = {}  # message_id -> vue
+        self.handled = 0
+
+    def owns(self, channel_id: int) -> bool:
+        return worker_for(channel_id, self.worker_count) == self.index
+
+    # Appels vers le frontal
+    def notify(self, target: str, method: str, *args):
+        self.outbox.put((self.index, None, target, method, args, {}))
+
+    async def call(self, target: str, method: str, *args, **kwargs):
+        call_id = next(self._call_ids)
+        future = self._calls[call_id] = asyncio.get_running_loop().create_future()
+        self.outbox.put((self.index, call_id, target, method, args, kwargs))
+        return await future
+
+    def _resolve(self, call_id: int, result, error):
+        future = self._calls.pop(call_id, None)
+        if future is None or future.done():
+            return
+        if error is None:
+            future.set_result(result)
+            return
+
+        import discord
+        kind, status, text = error
+        if kind == "NotFound":
+            future.set_exception(discord.NotFound(_RelayResponse(status, "Not Found"), text))
+        elif kind == "HTTPException":
+            future.set_exception(discord.HTTPException(_RelayResponse(status, ""), text))
+        else:
+            future.set_exception(RelayError(f"{kind}: {text}"))
+
+    # Vues de ce worker, rattachées aux messages envoyés par le frontal
+    def attach_view(self, message_id: int, view):
+        if view is ...:
+            return
+        if view is None:
+            self._views.pop(message_id, None)
+            return
+        if self._views.get(message_id) is view:
+            return
+        self._views[message_id] = view
+        loop = asyncio.get_running_loop()
+        loop.create_task(self._forget_when_finished(message_id, view))
+        if view.timeout is not None:
+            loop.call_later(view.timeout, self._time_out, view)
+
+    def _time_out(self, view):
+        if view.is_finished():
+            return
+        view.stop()
+        asyncio.get_running_loop().create_task(view.on_timeout())
+
+    async def _forget_when_finished(self, message_id: int, view):
+        # Vue arrêtée (réponse reçue, délai écoulé, fin du combat) : le frontal cesse de router ce message
+        await view.wait()
+        if self._views.get(message_id) is view:
+            del self._views[message_id]
+            self.notify("messages", "untrack", message_id, self.index)
+
+    # Traitement des interactions
+    async def handle(self, event: InteractionEvent):
+        relay = RelayInteraction(self, event)
+        self.handled += 1
+        # Comme le before_invoke du bot : attendre que les combats journalisés soient réinscrits
+        await self.rpg.combat_journal.ready.wait()
+        try:
+            if event.kind == "commande":
+                options = dict(event.options)
+                if "opponent" in options:
+                    member = options["opponent"]
+                    options["opponent"] = RelayUser(member["id"], member["display_name"], member["bot"])
+                await self.commands[event.name].callback(relay, **options)
+                return
+
+            view = self._views.get(event.message_id)
+            item = None
+            if view is not None:
+                item = next((child for child in view.children if getattr(child, "custom_id", None) == event.custom_id), None)
+            if item is None:
+                await relay.response.send_message("Cette interaction a expiré.", ephemeral=True)
+                return
+            if event.values:
+                # Équivalent de Select.refresh_state pour une interaction relayée
+                item._selected_values = list(event.values)
+                item._interaction = relay
+            await item.callback(relay)
+        except Exception as e:
+            print(f"❌ Worker {self.index} : erreur sur {event.kind} {event.name or event.custom_id}: {e!r}")
+
+    def _install(self):
+        """Brancher les commandes du bot sur les services du frontal"""
+        import discord_rpg_bot_complet as rpg
+
+        rpg.db = RemoteService(self, "db")
+        rpg.character_cache = RemoteService(self, "character_cache")
+        rpg.leaderboard_service = RemoteService(self, "leaderboard")
+        rpg.user_directory = RemoteService(self, "user_directory")
+        rpg.character_names = RemoteNameIndex(self, rpg)
+        rpg.combat_journal = rpg.CombatJournal(rpg.db)
+        worker = self
+
+        class PartitionRegistry(rpg.SessionRegistry):
+            """Registre du worker : signale au frontal les joueurs engagés, pour l'unicité entre workers"""
+
+            def add(self, session) -> bool:
+                added = super().add(session)
+                if added:
+                    worker.notify("players", "engage", [session.player1_id, session.player2_id])
+                return added
+
+            def _remove(self, session) -> bool:
+                removed = super()._remove(session)
+                if removed:
+                    worker.notify("players", "release", [session.player1_id, session.player2_id])
+                return removed
+
+        rpg.session_registry = PartitionRegistry(first_id=self.index + 1, id_step=self.worker_count)
+        rpg.session_registry.on_expire = rpg.expire_combat
+        if not self.throttle:
+            # Source simulée : aucune limite de Discord à respecter
+            rpg.outbound = rpg.OutboundDispatcher(capacity=10**9)
+        # Pas de passerelle dans un worker : les canaux sont joints par le frontal
+        rpg.bot.get_channel = lambda channel_id: RelayChannel(self, channel_id)
+
+        self.rpg = rpg
+        self.commands = {
+            "defier": rpg.challenge_player,
+            "choisir_personnage": rpg.choose_character,
+            "competence": rpg.use_skill_command,
+        }
+
+    async def run(self):
+        self._install()
+        loop = asyncio.get_running_loop()
+        reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"rpg-worker-{self.index}")
+        tasks = set()
+
+        self.rpg.session_registry.start()
+        restore = loop.create_task(self.rpg.combat_journal.restore(
+            self.rpg.session_registry, self.rpg.bot, self.rpg.user_directory, owns=self.owns))
+        tasks.add(restore)
+
+        while True:
+            message = await loop.run_in_executor(reader, self.inbox.get)
+            if message is None:
+                break
+            if isinstance(message, InteractionEvent):
+                task = loop.create_task(self.handle(message))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            else:
+                self._resolve(*message)
+
+        reader.shutdown(wait=False)
+
+def worker_main(index: int, worker_count: int, inbox, outbox, throttle: bool = True):
+    # Le worker n'ouvre pas la base : toutes ses lectures et écritures passent par le frontal
+    os.environ["RPG_DB_PATH"] = ":memory:"
+    asyncio.run(CombatWorker(index, worker_count, inbox, outbox, throttle).run())
+
+# ========== FRONTAL ==========
+
+class ClusterFront:
+    """Route les interactions vers les workers et sert leurs appels RPC"""
+
+    def __init__(self, rpg, worker_count: int, transport, throttle: bool = True):
+        self.rpg = rpg
+        self.worker_count = worker_count
+        self.transport = transport
+        context = multiprocessing.get_context("spawn")
+        self.outbox = context.Queue()
+        self.inboxes = [context.Queue() for _ in range(worker_count)]
+        self.processes = [
+            context.Process(target=worker_main,
+                            args=(index, worker_count, self.inboxes[index], self.outbox, throttle),
+                            name=f"rpg-worker-{index}", daemon=True)
+            for index in range(worker_count)
+        ]
+        self.services = {
+            "db": rpg.db,
+            "character_cache": rpg.character_cache,
+            "leaderboard": rpg.leaderboard_service,
+            "user_directory": rpg.user_directory,
+            "character_names": rpg.character_names,
+            "discord": transport,
+            "players": self,
+            "messages": self,
+        }
+        self.engaged: Dict[int, int] = {}  # joueur -> nombre de combats en cours (0 ou 1)
+        self.worker_messages: Dict[int, int] = {}  # message avec composants -> worker
+        self.routed = [0] * worker_count
+        self.calls = 0
+        self._reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rpg-front")
+        self._serve_task = None
+
+    def start(self):
+        for process in self.processes:
+            process.start()
+        self._serve_task = asyncio.get_running_loop().create_task(self._serve())
+
+    async def stop(self):
+        for inbox in self.inboxes:
+            inbox.put(None)
+        loop = asyncio.get_running_loop()
+        for process in self.processes:
+            await loop.run_in_executor(None, process.join, 5)
+        self.outbox.put(None)
+        if self._serve_task is not None:
+            await self._serve_task
+        self._reader.shutdown(wait=False)
+
+    # Joueurs engagés, tous workers confondus
+    def engage(self, players: List[int]):
+        for player_id in players:
+            self.engaged[player_id] = self.engaged.get(player_id, 0) + 1
+
+    def release(self, players: List[int]):
+        for player_id in players:
+            if self.engaged.get(player_id, 0) <= 1:
+                self.engaged.pop(player_id, None)
+            else:
+                self.engaged[player_id] -= 1
+
+    def is_engaged(self, user_id: int) -> bool:
+        return user_id in self.engaged
+
+    # Messages dont les composants sont routés vers un worker
+    def untrack(self, message_id: int, worker: int):
+        if self.worker_messages.get(message_id) == worker:
+            del self.worker_messages[message_id]
+
+    def route(self, event: InteractionEvent) -> int:
+        if event.kind == "composant" and event.message_id in self.worker_messages:
+            worker = self.worker_messages[event.message_id]
+        else:
+            worker = worker_for(event.channel_id, self.worker_count)
+        self.routed[worker] += 1
+        self.inboxes[worker].put(event)
+        return worker
+
+    async def _serve(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            message = await loop.run_in_executor(self._reader, self.outbox.get)
+            if message is None:
+                return
+            loop.create_task(self._call(*message))
+
+    async def _call(self, worker: int, call_id: Optional[int], target: str, method: str, args, kwargs):
+        self.calls += 1
+        result, error = None, None
+        try:
+            if method not in RPC_METHODS.get(target, ()):
+                raise RelayError(f"{target}.{method} n'est pas exposé aux workers")
+            result = getattr(self.services[target], method)(*args, **kwargs)
+            if asyncio.iscoroutine(result):
+                result = await result
+            if target == "discord" and method in ("followup", "send", "edit"):
+                # Les clics sur les composants d'un message reviennent au worker qui l'a produit
+                message_id = args[1] if method == "edit" else result
+                self._track_components(worker, message_id, args[-1])
+        except Exception as e:
+            status = getattr(e, "status", 0)
+            error = (type(e).__name__ if type(e).__name__ in ("NotFound", "HTTPException") else "Erreur",
+                     status, str(e))
+            if status and error[0] == "Erreur":
+                error = ("HTTPException", status, str(e))
+        if call_id is not None:
+            self.inboxes[worker].put((call_id, result, error))
+        elif error is not None:
+            print(f"❌ Notification {target}.{method} du worker {worker}: {error[2]}")
+
+    def _track_components(self, worker: int, message_id: int, payload: Dict):
+        if "components" not in payload:
+            return
+        if payload["components"]:
+            self.worker_messages[message_id] = worker
+        else:
+            self.worker_messages.pop(message_id, None)
+
+    def metrics(self) -> Dict:
+        return {
+            "workers": self.worker_count,
+            "routed": list(self.routed),
+            "rpc_calls": self.calls,
+            "engaged_players": len(self.engaged),
+            "worker_messages": len(self.worker_messages),
+        }
+
+# Exécution des réponses sur Discord
+class DiscordTransport:
+    """Applique les réponses des workers par l'API HTTP de Discord"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._interactions: Dict[int, Tuple[object, float]] = {}  # id -> (interaction, reçue à)
+
+    def track(self, interaction):
+        now = time.monotonic()
+        self._interactions[interaction.id] = (interaction, now)
+        # Les jetons expirent après 15 minutes : les interactions plus anciennes ne servent plus
+        while self._interactions:
+            oldest_id, (_, received) = next(iter(self._interactions.items()))
+            if now - received < INTERACTION_LIFETIME:
+                break
+            del self._interactions[oldest_id]
+
+    def _interaction(self, interaction_id: int):
+        return self._interactions[interaction_id][0]
+
+    async def respond(self, interaction_id: int, payload: Dict):
+        interaction = self._interaction(interaction_id)
+        await self.bot.http.create_interaction_response(interaction.id, interaction.token, type=4, data=payload)
+
+    async def defer(self, interaction_id: int, ephemeral: bool = False):
+        import discord
+        interaction = self._interaction(interaction_id)
+        # Un composant est acquitté sans message ; une commande affiche « réfléchit... »
+        response_type = 6 if interaction.type == discord.InteractionType.component else 5
+        data = {"flags": 64} if ephemeral else None
+        await self.bot.http.create_interaction_response(interaction.id, interaction.token, type=response_type, data=data)
+
+    async def followup(self, interaction_id: int, payload: Dict) -> int:
+        from discord.http import Route
+        interaction = self._interaction(interaction_id)
+        route = Route("POST", "/webhooks/{application_id}/{interaction_token}",
+                      application_id=interaction.application_id, interaction_token=interaction.token)
+        data = await self.bot.http.request(route, json=payload, params={"wait": "true"})
+        return int(data["id"])
+
+    async def send(self, channel_id: int, payload: Dict) -> int:
+        from discord.http import Route
+        route = Route("POST", "/channels/{channel_id}/messages", channel_id=channel_id)
+        data = await self.bot.http.request(route, json=payload)
+        return int(data["id"])
+
+    async def edit(self, channel_id: int, message_id: int, payload: Dict):
+        await self.bot.http.edit_message(channel_id, message_id, **payload)
+
+def event_from_interaction(interaction) -> InteractionEvent:
+    """Extraire d'une interaction Discord l'événement transmis au worker"""
+    import discord
+
+    data = interaction.data or {}
+    event = InteractionEvent(
+        interaction_id=interaction.id,
+        kind="composant" if interaction.type == discord.InteractionType.component else "commande",
+        channel_id=interaction.channel_id,
+        user_id=interaction.user.id,
+        user_name=interaction.user.display_name,
+    )
+    if event.kind == "composant":
+        event.message_id = interaction.message.id if interaction.message else None
+        event.custom_id = data.get("custom_id", "")
+        event.values = list(data.get("values", []))
+        return event
+
+    event.name = data.get("name", "")
+    resolved = data.get("resolved", {})
+    for option in data.get("options", []):
+        value = option["value"]
+        if option.get("type") == discord.SlashCommandOptionType.user.value:
+            user = resolved.get("users", {}).get(str(value), {})
+            member = resolved.get("members", {}).get(str(value), {})
+            display_name = member.get("nick") or user.get("global_name") or user.get("username", str(value))
+            value = {"id": int(value), "display_name": display_name, "bot": user.get("bot", False)}
+        event.options[option["name"]] = value
+    return event
+
+def run_front(worker_count: int):
+    """Lancer le bot en frontal : les commandes de combat sont exécutées par les workers"""
+    import discord
+    import discord_rpg_bot_complet as rpg
+
+    bot = rpg.bot
+    transport = DiscordTransport(bot)
+    front = ClusterFront(rpg, worker_count, transport)
+
+    @bot.event
+    async def on_ready():
+        print(f'{bot.user} est connecté en frontal de {worker_count} worker(s)')
+        rpg.character_cache.start()
+        await rpg.leaderboard_service.load()
+        if front._serve_task is None:
+            # Les workers reprennent eux-mêmes les combats journalisés de leurs canaux
+            rpg.combat_journal.ready.set()
+            front.start()
+        await bot.change_presence(activity=discord.Game(name="RPG Discord | /aide"))
+
+    @bot.event
+    async def on_interaction(interaction: discord.Interaction):
+        data = interaction.data or {}
+        if interaction.type == discord.InteractionType.application_command and data.get("name") in ROUTED_COMMANDS:
+            event = event_from_interaction(interaction)
+            opponent = event.options.get("opponent")
+            if event.name == "defier" and opponent and any(map(front.is_engaged, (event.user_id, opponent["id"]))):
+                await interaction.response.send_message("Un des joueurs participe déjà à un combat!")
+                return
+            transport.track(interaction)
+            front.route(event)
+        elif interaction.type == discord.InteractionType.component and interaction.message \
+                and interaction.message.id in front.worker_messages:
+            transport.track(interaction)
+            front.route(event_from_interaction(interaction))
+        else:
+            await bot.process_application_commands(interaction)
+
+    try:
+        bot.run(rpg.TOKEN)
+    finally:
+        asyncio.run(rpg.character_cache.flush())
+        rpg.write_warm_snapshot(rpg.leaderboard_service, rpg.character_cache)
+        rpg.db.close()
+
+# ========== SOURCE D'INTERACTIONS SIMULÉE ==========
+
+class FakeDiscord:
+    """Transport sans connexion qui joue aussi le rôle des joueurs.
+
+    Chaque message reçu d'un worker est lu comme le ferait un joueur : les
+    menus d'objectif et de pierre-feuille-ciseaux reçoivent un choix, le
+    tableau de combat un clic du joueur dont c'est le tour.
+    """
+
+    TURN_PATTERN = re.compile(r"C'est au tour de \*\*(.+?)\*\*")
+
+    def __init__(self, seed: int = 0):
+        self.rng = random.Random(seed)
+        self.front: Optional[ClusterFront] = None
+        self._message_ids = itertools.count(1_000_000)
+        self._interaction_ids = itertools.count(1)
+        self._interaction_channels: Dict[int, int] = {}
+        self.messages: Dict[int, Dict] = {}
+        self.responses: Dict[int, asyncio.Future] = {}
+        self.players: Dict[str, int] = {}  # nom d'affichage -> identifiant
+        self.characters: Dict[int, str] = {}  # joueur -> valeur choisie dans l'autocomplétion
+        self.finished: Dict[int, asyncio.Future] = {}
+        self.sent = 0
+        self.clicks = 0
+
+    # Transport
+    def _answered(self, interaction_id: int, payload: Optional[Dict]):
+        future = self.responses.get(interaction_id)
+        if future is not None and not future.done():
+            future.set_result(payload)
+
+    async def respond(self, interaction_id: int, payload: Dict):
+        self.sent += 1
+        self._answered(interaction_id, payload)
+
+    async def defer(self, interaction_id: int, ephemeral: bool = False):
+        self._answered(interaction_id, None)
+
+    async def followup(self, interaction_id: int, payload: Dict) -> int:
+        return await self._post(self._channel_of(interaction_id), payload)
+
+    async def send(self, channel_id: int, payload: Dict) -> int:
+        return await self._post(channel_id, payload)
+
+    async def edit(self, channel_id: int, message_id: int, payload: Dict):
+        self.sent += 1
+        message = self.messages.setdefault(message_id, {"channel_id": channel_id})
+        message.update(payload)
+        asyncio.get_running_loop().call_soon(self._react, message_id, message)
+
+    async def _post(self, channel_id: int, payload: Dict) -> int:
+        self.sent += 1
+        message_id = next(self._message_ids)
+        self.messages[message_id] = dict(payload, channel_id=channel_id)
+        # Un joueur ne voit le message qu'une fois son identifiant renvoyé au worker
+        asyncio.get_running_loop().call_soon(self._react, message_id, self.messages[message_id])
+        return message_id
+
+    def _channel_of(self, interaction_id: int) -> int:
+        return self._interaction_channels[interaction_id]
+
+    # Joueurs simulés
+    def _event(self, channel_id: int, user_id: int, **kwargs) -> InteractionEvent:
+        interaction_id = next(self._interaction_ids)
+        self._interaction_channels[interaction_id] = channel_id
+        return InteractionEvent(interaction_id=interaction_id, channel_id=channel_id, user_id=user_id,
+                                user_name=f"Joueur{user_id}", **kwargs)
+
+    async def command(self, channel_id: int, user_id: int, name: str, timeout: float = 10.0,
+                      **options) -> Optional[Dict]:
+        event = self._event(channel_id, user_id, kind="commande", name=name, options=options)
+        future = self.responses[event.interaction_id] = asyncio.get_running_loop().create_future()
+        self.front.route(event)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            del self.responses[event.interaction_id]
+
+    def click(self, channel_id: int, user_id: int, message_id: int, custom_id: str, values=()):
+        self.clicks += 1
+        event = self._event(channel_id, user_id, kind="composant", message_id=message_id,
+                            custom_id=custom_id, values=list(values))
+        self.front.route(event)
+
+    def _react(self, message_id: int, message: Dict):
+        channel_id = message["channel_id"]
+        for embed in message.get("embeds", []):
+            if "remporte la victoire" in embed.get("description", ""):
+                future = self.finished.get(channel_id)
+                if future is not None and not future.done():
+                    future.set_result(message_id)
+                return
+
+        components = [c for row in message.get("components", []) for c in row["components"]]
+        if not components:
+            return
+
+        if components[0]["type"] == 3:  # Menu : objectif ou pierre-feuille-ciseaux, adressé par mention
+            user_id = int(re.match(r"<@(\d+)>", message.get("content", "")).group(1))
+            values = [option["value"] for option in components[0]["options"]]
+            # Les joueurs simulés ne font qu'attaquer : seul l'objectif K.O. termine le duel
+            value = "1" if "1" in values else self.rng.choice(values)
+            self.click(channel_id, user_id, message_id, components[0]["custom_id"], [value])
+            return
+
+        # Tableau de combat : le joueur dont c'est le tour attaque
+        description = message.get("embeds", [{}])[0].get("description", "")
+        match = self.TURN_PATTERN.search(description)
+        if match:
+            self.click(channel_id, self.players[match.group(1)], message_id, "rpg_combat:attaque")
+
+    async def play_duel(self, channel_id: int, player1: int, player2: int, timeout: float = 60.0) -> bool:
+        self.finished[channel_id] = asyncio.get_running_loop().create_future()
+        opponent = {"id": player2, "display_name": f"Joueur{player2}", "bot": False}
+        await self.command(channel_id, player1, "defier", opponent=opponent)
+        await self.command(channel_id, player1, "choisir_personnage", nom_personnage=self.characters[player1])
+        await self.command(channel_id, player2, "choisir_personnage", nom_personnage=self.characters[player2])
+        try:
+            await asyncio.wait_for(self.finished[channel_id], timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+def hero_name(player_id: int) -> str:
+    """Nom du personnage d'un joueur simulé : les joueurs pairs dépassent la limite de 100 caractères
+    d'une proposition d'autocomplétion, pour exercer les références de noms longs"""
+    if player_id % 2:
+        return f"Héros{player_id}"
+    return f"Héros{player_id}, " + "gardien des terres oubliées et " * 4 + "porteur de la lame ancienne"
+
+async def create_fake_players(rpg, transport: FakeDiscord, count: int):
+    """Créer les joueurs simulés 1..count et leur personnage, choisi ensuite comme via l'autocomplétion"""
+    for player_id in range(1, count + 1):
+        transport.players[f"Joueur{player_id}"] = player_id
+        name = hero_name(player_id)
+        transport.characters[player_id] = rpg.autocomplete_choice(name, name).value
+        skills = [rpg.Skill(name="Frappe", effect="", category=rpg.SkillCategory.ATTAQUE),
+                  rpg.Skill(name="Garde", effect="", category=rpg.SkillCategory.BONUS)]
+        await rpg.character_cache.save_character(rpg.Character(name=name, owner_id=player_id, skills=skills))
+    await rpg.leaderboard_service.load()
+
+async def run_fake(worker_count: int, duels: int, concurrency: int, seed: int, throttle: bool = True,
+                   timeout: float = 300.0) -> Dict:
+    """Jouer `duels` combats complets à travers le frontal et les workers, sans Discord"""
+    import discord_rpg_bot_complet as rpg
+
+    transport = FakeDiscord(seed)
+    front = ClusterFront(rpg, worker_count, transport, throttle)
+    transport.front = front
+
+    await create_fake_players(rpg, transport, 2 * duels)
+    rpg.character_cache.start()
+    front.start()
+
+    semaphore = asyncio.Semaphore(concurrency)
+    channel_ids = random.Random(seed).sample(range(10**17, 10**18), duels)
+
+    async def one(index: int) -> bool:
+        async with semaphore:
+            return await transport.play_duel(channel_ids[index], 2 * index + 1, 2 * index + 2, timeout)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one(index) for index in range(duels)))
+    elapsed = time.perf_counter() - start
+
+    await front.stop()
+    await rpg.character_cache.flush()
+    return {
+        "duels": duels,
+        "completed": sum(results),
+        "seconds": elapsed,
+        "messages": transport.sent,
+        "clicks": transport.clicks,
+        **front.metrics(),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Lancer le bot RPG sur plusieurs processus")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--fake", action="store_true", help="Jouer des duels simulés sans connexion Discord")
+    parser.add_argument("--duels", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=50, help="Duels simulés simultanés")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-throttle", action="store_true",
+                        help="Sans limite d'envoi par canal, pour mesurer le débit des workers")
+    args = parser.parse_args()
+
+    if not args.fake:
+        run_front(args.workers)
+        return
+
+    # Base en mémoire par défaut : la simulation ne touche pas aux vrais personnages
+    os.environ.setdefault("RPG_DB_PATH", ":memory:")
+    results = asyncio.run(run_fake(args.workers, args.duels, args.concurrency, args.seed, not args.no_throttle))
+    print(f"⚔️ {results['completed']}/{results['duels']} duels en {results['seconds']:.2f}s "
+          f"({results['completed'] / results['seconds']:,.1f} duels/s) sur {results['workers']} worker(s)")
+    print(f"📨 {results['messages']} messages, {results['clicks']} clics, {results['rpc_calls']} appels RPC")
+    print(f"🔀 Interactions par worker : {results['routed']}")
+
+if __name__ == "__main__":
+    main()
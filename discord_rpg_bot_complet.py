@@ -6,15 +6,67 @@ import sqlite3
 import asyncio
 import json
 import os
-from typing import List, Dict, Optional, Tuple
-from dataclasses import dataclass, asdict
+import functools
+import gzip
+import hashlib
+import time
+import bisect
+import copy
+import heapq
+import sys
+import threading
+import traceback
+from array import array
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Dict, Optional, Tuple
+from dataclasses import dataclass, asdict, astuple, fields
 from enum import Enum
 
+try:
+    import numpy as np  # Optionnel : uniquement pour les calculs de dégâts par lot
+except ImportError:
+    np = None
+
 # Configuration du bot
+STARTED_AT = time.monotonic()  # Origine des mesures du temps de démarrage
 TOKEN = os.environ.get('DISCORD_TOKEN')  # Remplacez par votre token Discord
+DB_PATH = os.environ.get('RPG_DB_PATH', 'discord_rpg.db')
+SQL_BATCH_SIZE = 500  # Nombre maximal de paramètres par clause IN (...)
+CACHE_SIZE = int(os.environ.get('RPG_CACHE_SIZE', '1024'))  # Personnages gardés en mémoire
+CACHE_FLUSH_INTERVAL = float(os.environ.get('RPG_CACHE_FLUSH_INTERVAL', '5'))  # Secondes entre deux écritures
+LEADERBOARD_DEPTH = int(os.environ.get('RPG_LEADERBOARD_DEPTH', '1000'))  # Rangs gardés en mémoire par critère
+LEADERBOARD_PAGE_SIZE = 10
+NAME_INDEX_OWNERS = int(os.environ.get('RPG_NAME_INDEX_OWNERS', '50000'))  # Joueurs dont les noms sont indexés
+AUTOCOMPLETE_LIMIT = 25  # Propositions maximales d'une autocomplétion Discord
+AUTOCOMPLETE_TEXT_MAX = 100  # Longueur maximale du libellé et de la valeur d'une proposition
+# Limite locale d'envoi par canal, calée sur celle de Discord (5 messages / 5 s)
+CHANNEL_RATE_LIMIT = 5
+CHANNEL_RATE_PERIOD = 5.0
+MAX_MESSAGE_LENGTH = 2000
+MAX_EMBEDS_PER_MESSAGE = 10
+SESSION_TTL = float(os.environ.get('RPG_SESSION_TTL', '900'))  # Secondes d'inactivité avant l'abandon d'un combat
+MAX_SESSIONS = int(os.environ.get('RPG_MAX_SESSIONS', '500'))  # Combats simultanés au maximum
+PROMPT_TIMEOUT = 60.0  # Secondes pour répondre à chaque étape de la création d'un personnage
+USER_CACHE_TTL = float(os.environ.get('RPG_USER_CACHE_TTL', '3600'))  # Durée de vie d'un nom d'affichage en cache
+USER_CACHE_SIZE = 10000
+USER_FETCH_BATCH = 10  # Profils récupérés en parallèle par l'API REST
+USER_FETCH_RATE = 10  # Requêtes de profil par seconde au maximum
+UNKNOWN_USER = "Utilisateur inconnu"
+METRICS_HOST = os.environ.get('RPG_METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.environ.get('RPG_METRICS_PORT', '0'))  # Port HTTP des métriques Prometheus (0 : désactivé)
+LOOP_LAG_INTERVAL = 0.5  # Secondes entre deux mesures du retard de la boucle asyncio
+WATCHDOG_THRESHOLD = float(os.environ.get('RPG_WATCHDOG_THRESHOLD', '0.5'))  # Blocage signalé au-delà (0 : désactivé)
+FORCE_COMMAND_SYNC = os.environ.get('RPG_FORCE_SYNC', '') not in ('', '0')  # Synchroniser même sans changement
+WARM_SNAPSHOT_PATH = os.environ.get(  # Données chaudes écrites à l'arrêt ('' : désactivé)
+    'RPG_WARM_SNAPSHOT', '' if DB_PATH == ':memory:' else DB_PATH + '.chaud.json.gz')
+WARM_SNAPSHOT_CHARACTERS = 256  # Personnages récents gardés dans l'instantané
+WARM_SNAPSHOT_VERSION = 1
 intents = discord.Intents.default()
 intents.message_content = True
-bot = discord.Bot(intents=intents)
+intents.members = True  # Classement par serveur : appartenance des joueurs au serveur
+# Les membres d'un serveur ne sont chargés qu'à son premier classement par serveur
+bot = discord.Bot(intents=intents, chunk_guilds_at_startup=False)
 
 # Enums et classes de données (identiques)
 class SkillCategory(Enum):
@@ -40,33 +92,56 @@ class ObjectifVictoire(Enum):
     VIDER_POUVOIR = "Vider la jauge de pouvoir"
     CONSOMMER_BLOODLUST = "Consommer l'état de bloodlust"
 
-@dataclass
+# Rang de chaque membre, pour indexer les tables ci-dessous sans hacher d'enum
+for _enum in (SkillCategory, Talent):
+    for _ordinal, _member in enumerate(_enum):
+        _member.ordinal = _ordinal
+
+# Tables précalculées, indexées par SkillCategory.ordinal
+SKILL_POWER_COSTS = (10.0, 15.0, 15.0, 20.0)
+SKILL_COOLDOWNS = (1, 2, 2, 3)
+# Le dernier élément (indice -1) correspond à une attaque basique
+SKILL_DAMAGE_MULTIPLIERS = (1.5, 1.0, 1.0, 0.8, 1.0)
+NO_SKILL = -1
+
+# Chaque talent domine le suivant dans ce cycle
+TALENT_ADVANTAGES = [
+    (Talent.YEUX_DIEU, Talent.DIEU_VITESSE),
+    (Talent.DIEU_VITESSE, Talent.INEGALE),
+    (Talent.INEGALE, Talent.FORTERESSE),
+    (Talent.FORTERESSE, Talent.OVERPOWERED),
+    (Talent.OVERPOWERED, Talent.YEUX_DIEU),
+]
+
+def _build_talent_matrix() -> Tuple[Tuple[float, ...], ...]:
+    matrix = [[1.0] * len(Talent) for _ in Talent]
+    for strong, weak in TALENT_ADVANTAGES:
+        matrix[strong.ordinal][weak.ordinal] = 1.1
+        matrix[weak.ordinal][strong.ordinal] = 0.9
+    return tuple(tuple(row) for row in matrix)
+
+# TALENT_MATRIX[attaquant][défenseur] : modificateur de dégâts
+TALENT_MATRIX = _build_talent_matrix()
+
+# Instances sans __dict__ pour les personnages gardés en cache (Python 3.10+)
+SLOTTED = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+@dataclass(**SLOTTED)
 class Skill:
     name: str
     effect: str
     category: SkillCategory
-    cooldown: int = 0
+    db_id: Optional[int] = None  # Identifiant de la ligne dans la table skills
 
     def get_power_cost(self) -> float:
-        costs = {
-            SkillCategory.ATTAQUE: 10.0,
-            SkillCategory.BONUS: 15.0,
-            SkillCategory.MALUS: 15.0,
-            SkillCategory.RESTREINTE: 20.0
-        }
-        return costs[self.category]
+        return SKILL_POWER_COSTS[self.category.ordinal]
 
     def get_cooldown_duration(self) -> int:
-        durations = {
-            SkillCategory.ATTAQUE: 1,
-            SkillCategory.BONUS: 2,
-            SkillCategory.MALUS: 2,
-            SkillCategory.RESTREINTE: 3
-        }
-        return durations[self.category]
+        return SKILL_COOLDOWNS[self.category.ordinal]
 
-@dataclass
+@dataclass(**SLOTTED)
 class Character:
+    """Données persistantes d'un personnage ; son état pendant un duel est dans CombatState"""
     name: str
     owner_id: int
     hp: int = 1000
@@ -76,16 +151,7 @@ class Character:
     level: int = 1
     experience: int = 0
     skills: List[Skill] = None
-
-    # États de combat
-    defending: bool = False
-    defense_cooldown: int = 0
-    bonus_next_attack: float = 1.0
-    malus_next_received: float = 1.0
-    bloodlust_turns: int = 0
-    weakened_turns: int = 0
-    skip_next_turn: bool = False
-    was_in_bloodlust: bool = False
+    db_id: Optional[int] = None  # Identifiant de la ligne dans la table characters
 
     def __post_init__(self):
         if self.skills is None:
@@ -96,51 +162,204 @@ class Character:
     def can_level_up(self) -> bool:
         return self.experience >= self.get_level_threshold()
 
+    @staticmethod
+    def level_threshold(level: int) -> int:
+        """XP nécessaire pour passer du niveau `level` au suivant : 5000 + 200 * (1 + ... + level - 1)"""
+        return 5000 + 100 * (level - 1) * level
+
+    @staticmethod
+    def cumulative_experience(level: int) -> int:
+        """XP totale nécessaire pour atteindre `level` depuis le niveau 1"""
+        return 5000 * (level - 1) + 100 * level * (level - 1) * (level - 2) // 3
+
     def get_level_threshold(self) -> int:
-        if self.level == 1:
-            return 5000
-        threshold = 5000
-        for i in range(2, self.level + 1):
-            threshold += 200 * (i - 1)
-        return threshold
-
-    def level_up(self):
-        while self.can_level_up():
-            threshold = self.get_level_threshold()
-            overflow = self.experience - threshold
-            self.experience = overflow
-            self.level += 1
+        return self.level_threshold(self.level)
+
+    def level_up(self) -> int:
+        """Passer directement au niveau atteint avec l'XP actuelle ; renvoie le nombre de niveaux gagnés"""
+        if not self.can_level_up():
+            return 0
+
+        total = self.cumulative_experience(self.level) + self.experience
+
+        # Recherche exponentielle puis dichotomique du plus haut niveau dont le cumul ne dépasse
+        # pas l'XP totale : O(log(niveaux gagnés)), indépendant du niveau de départ
+        low, step = self.level + 1, 1
+        while self.cumulative_experience(low + step) <= total:
+            low, step = low + step, step * 2
+        high = low + step
+        while high - low > 1:
+            middle = (low + high) // 2
+            if self.cumulative_experience(middle) <= total:
+                low = middle
+            else:
+                high = middle
 
-    def get_talent_advantage(self, opponent_talent: Talent) -> float:
-        advantages = {
-            (Talent.YEUX_DIEU, Talent.DIEU_VITESSE): 1.1,
-            (Talent.DIEU_VITESSE, Talent.INEGALE): 1.1,
-            (Talent.INEGALE, Talent.FORTERESSE): 1.1,
-            (Talent.FORTERESSE, Talent.OVERPOWERED): 1.1,
-            (Talent.OVERPOWERED, Talent.YEUX_DIEU): 1.1
-        }
+        gained = low - self.level
+        self.level = low
+        self.experience = total - self.cumulative_experience(low)
+        return gained
 
-        if (self.talent, opponent_talent) in advantages:
-            return 1.1
-        elif (opponent_talent, self.talent) in advantages:
-            return 0.9
-        else:
-            return 1.0
+    def get_talent_advantage(self, opponent_talent: Talent) -> float:
+        return TALENT_MATRIX[self.talent.ordinal][opponent_talent.ordinal]
+
+    def to_snapshot(self) -> dict:
+        data = asdict(self)
+        data["talent"] = self.talent.name
+        for skill in data["skills"]:
+            skill["category"] = skill["category"].name
+        return data
+
+    @classmethod
+    def from_snapshot(cls, data: dict) -> "Character":
+        # Les anciens instantanés contiennent aussi l'état de combat : il est lu par CombatState
+        data = {name: data[name] for name in CHARACTER_FIELDS if name in data}
+        data["talent"] = Talent[data["talent"]]
+        data["skills"] = [Skill(**{name: skill[name] for name in SKILL_FIELDS if name in skill},
+                                category=SkillCategory[skill["category"]])
+                          for skill in data["skills"]]
+        return cls(**data)
+
+CHARACTER_FIELDS = tuple(field.name for field in fields(Character))
+SKILL_FIELDS = tuple(field.name for field in fields(Skill) if field.name != "category")
+
+# État d'un personnage pendant un duel, remis à neuf à chaque combat
+COMBAT_FIELDS = ("hp", "power_gauge", "defending", "defense_cooldown", "bonus_next_attack",
+                 "malus_next_received", "bloodlust_turns", "weakened_turns", "skip_next_turn", "was_in_bloodlust")
+
+class Fighter:
+    """Un combattant : les champs de combat d'un personnage, sans __dict__.
+
+    Le nom, le talent, les compétences et les PV maximum sont repris du
+    personnage, qui ne change pas pendant le duel. Les recharges des
+    compétences sont un array('b'), dans l'ordre de character.skills ;
+    skill_index donne l'indice d'une compétence d'après son nom sans casse.
+    """
+
+    __slots__ = ("character", "name", "talent", "skills", "skill_index", "max_hp",
+                 "skill_cooldowns") + COMBAT_FIELDS
+
+    def __init__(self, character: Character):
+        self.character = character
+        self.name = character.name
+        self.talent = character.talent
+        self.skills = character.skills
+        self.skill_index = {}
+        for index, skill in enumerate(self.skills):
+            # En cas de doublon, la première compétence du nom l'emporte
+            self.skill_index.setdefault(skill.name.casefold(), index)
+        self.max_hp = character.max_hp
+        self.hp = character.max_hp
+        self.power_gauge = 100.0
+        self.defending = False
+        self.defense_cooldown = 0
+        self.bonus_next_attack = 1.0
+        self.malus_next_received = 1.0
+        self.bloodlust_turns = 0
+        self.weakened_turns = 0
+        self.skip_next_turn = False
+        self.was_in_bloodlust = False
+        self.skill_cooldowns = array('b', bytes(len(character.skills)))
+
+    def copy(self) -> "Fighter":
+        fighter = Fighter.__new__(Fighter)
+        for name in Fighter.__slots__:
+            setattr(fighter, name, getattr(self, name))
+        fighter.skill_cooldowns = array('b', self.skill_cooldowns)
+        return fighter
+
+    def to_snapshot(self) -> dict:
+        data = {name: getattr(self, name) for name in COMBAT_FIELDS}
+        data["skill_cooldowns"] = self.skill_cooldowns.tolist()
+        return data
+
+    def restore(self, data: dict):
+        for name in COMBAT_FIELDS:
+            setattr(self, name, data[name])
+        self.skill_cooldowns = array('b', data["skill_cooldowns"])
+
+class CombatState:
+    """État de combat des deux personnages d'un duel, séparé de leurs données persistantes.
+
+    Le choisir, le copier (simulation, rejeu) ou le sérialiser ne touche
+    jamais aux personnages du cache.
+    """
+
+    __slots__ = ("fighters",)
+
+    def __init__(self, char1: Character, char2: Character):
+        self.fighters = (Fighter(char1), Fighter(char2))
+
+    def copy(self) -> "CombatState":
+        state = CombatState.__new__(CombatState)
+        state.fighters = (self.fighters[0].copy(), self.fighters[1].copy())
+        return state
+
+    def to_snapshot(self) -> List[dict]:
+        return [fighter.to_snapshot() for fighter in self.fighters]
+
+    @classmethod
+    def from_snapshot(cls, data: List[dict], char1: Character, char2: Character) -> "CombatState":
+        """État d'un instantané ; les anciens portaient les champs de combat dans chaque personnage"""
+        state = cls(char1, char2)
+        for fighter, fighter_data in zip(state.fighters, data):
+            if "skill_cooldowns" not in fighter_data:
+                fighter_data = dict(fighter_data,
+                                    skill_cooldowns=[skill.get("cooldown", 0) for skill in fighter_data["skills"]])
+            fighter.restore(fighter_data)
+        return state
 
 # Classes pour gérer les combats (identiques)
 class CombatSession:
-    def __init__(self, player1_id: int, player2_id: int, channel_id: int):
+    def __init__(self, player1_id: int, player2_id: int, channel_id: int,
+                 player1_name: str = "Joueur 1", player2_name: str = "Joueur 2"):
+        self.session_id = None  # Attribué par le registre des combats
         self.player1_id = player1_id
         self.player2_id = player2_id
         self.channel_id = channel_id
+        # Noms d'affichage capturés au défi : aucun appel à l'API pendant le combat
+        self.player1_name = player1_name
+        self.player2_name = player2_name
         self.player1_character = None
         self.player2_character = None
+        # État du duel, créé par prepare_combat une fois les deux personnages choisis
+        self.state = None
+        self.fighters = None
         self.player1_objective = None
         self.player2_objective = None
         self.current_turn = None
         self.turn_count = 0
         self.rps_results = {}
+        self.rps_round = 0  # Manche de pierre-feuille-ciseaux en cours : les menus d'une manche passée sont refusés
         self.combat_started = False
+        # Message unique du combat, modifié à chaque tour, et sa vue de boutons
+        self.board_message_id = None
+        self.view = None
+        # Modification du tableau en attente d'envoi, et fin de la dernière envoyée (OutboundDispatcher)
+        self.board_update = None
+        self.board_delivered = None
+        self.finished = False
+        # Les actions d'un même combat sont appliquées une par une, dans l'ordre
+        self._lock = None
+        self.pending_actions = set()
+        # Dernière action d'un joueur, pour l'expiration des combats abandonnés
+        self.last_activity = time.monotonic()
+
+    def touch(self):
+        self.last_activity = time.monotonic()
+
+    @property
+    def lock(self) -> asyncio.Lock:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    def can_act(self, player_id: int, require_turn: bool = True) -> bool:
+        if self.finished or not self.combat_started:
+            return False
+        if require_turn:
+            return player_id == self.current_turn
+        return player_id in (self.player1_id, self.player2_id)
 
     def both_players_ready(self) -> bool:
         return (self.player1_character is not None and 
@@ -151,48 +370,424 @@ class CombatSession:
     def get_opponent_id(self, player_id: int) -> int:
         return self.player2_id if player_id == self.player1_id else self.player1_id
 
+    def get_player_name(self, player_id: int) -> str:
+        return self.player1_name if player_id == self.player1_id else self.player2_name
+
     def get_character(self, player_id: int) -> Character:
         return self.player1_character if player_id == self.player1_id else self.player2_character
 
-    def get_opponent_character(self, player_id: int) -> Character:
-        return self.player2_character if player_id == self.player1_id else self.player1_character
+    def prepare_combat(self, state: Optional[CombatState] = None):
+        """Repartir d'un état de combat neuf (ou de `state`) pour les deux personnages choisis"""
+        self.state = state or CombatState(self.player1_character, self.player2_character)
+        self.fighters = self.state.fighters
+
+    def get_fighter(self, player_id: int) -> Fighter:
+        return self.fighters[0] if player_id == self.player1_id else self.fighters[1]
+
+    def get_opponent_fighter(self, player_id: int) -> Fighter:
+        return self.fighters[1] if player_id == self.player1_id else self.fighters[0]
+
+    def to_snapshot(self) -> dict:
+        """État complet d'un combat commencé, sérialisable en JSON"""
+        return {
+            "session_id": self.session_id,
+            "players": [self.player1_id, self.player2_id],
+            "names": [self.player1_name, self.player2_name],
+            "channel_id": self.channel_id,
+            "characters": [self.player1_character.to_snapshot(), self.player2_character.to_snapshot()],
+            "state": self.state.to_snapshot(),
+            "objectives": [self.player1_objective.name, self.player2_objective.name],
+            "current_turn": self.current_turn,
+            "turn_count": self.turn_count,
+            "board_message_id": self.board_message_id,
+        }
+
+    @classmethod
+    def from_snapshot(cls, data: dict) -> "CombatSession":
+        session = cls(data["players"][0], data["players"][1], data["channel_id"],
+                      *data.get("names", [UNKNOWN_USER, UNKNOWN_USER]))
+        session.session_id = data.get("session_id")
+        session.player1_character = Character.from_snapshot(data["characters"][0])
+        session.player2_character = Character.from_snapshot(data["characters"][1])
+        session.prepare_combat(CombatState.from_snapshot(data.get("state", data["characters"]),
+                                                         session.player1_character, session.player2_character))
+        session.player1_objective = ObjectifVictoire[data["objectives"][0]]
+        session.player2_objective = ObjectifVictoire[data["objectives"][1]]
+        session.current_turn = data["current_turn"]
+        session.turn_count = data["turn_count"]
+        session.board_message_id = data.get("board_message_id")
+        session.combat_started = True
+        return session
+
+# Migrations du schéma : la version appliquée est suivie par PRAGMA user_version.
+# Chaque entrée est la liste des requêtes qui font passer la base à la version suivante.
+SCHEMA_MIGRATIONS = [
+    # Version 1 : schéma initial (sans effet sur les bases existantes)
+    [
+        """
+        CREATE TABLE IF NOT EXISTS characters (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            owner_id INTEGER NOT NULL,
+            hp INTEGER DEFAULT 1000,
+            max_hp INTEGER DEFAULT 1000,
+            power_gauge REAL DEFAULT 100.0,
+            talent TEXT NOT NULL,
+            level INTEGER DEFAULT 1,
+            experience INTEGER DEFAULT 0,
+            UNIQUE(name, owner_id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS skills (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            character_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            effect TEXT NOT NULL,
+            category TEXT NOT NULL,
+            FOREIGN KEY (character_id) REFERENCES characters (id)
+        )
+        """,
+    ],
+    # Version 2 : index pour les jointures, les listes par joueur et le classement.
+    # Les recherches par nom seul utilisent déjà l'index de UNIQUE(name, owner_id).
+    [
+        "CREATE INDEX IF NOT EXISTS idx_skills_character_id ON skills (character_id)",
+        "CREATE INDEX IF NOT EXISTS idx_characters_owner_id ON characters (owner_id)",
+        "CREATE INDEX IF NOT EXISTS idx_characters_level_experience ON characters (level DESC, experience DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_characters_experience ON characters (experience DESC)",
+    ],
+    # Version 3 : journal des combats en cours, rejoué au redémarrage
+    [
+        """
+        CREATE TABLE IF NOT EXISTS combat_journal (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            channel_id INTEGER NOT NULL,
+            turn_count INTEGER NOT NULL,
+            state TEXT NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_combat_journal_channel_id ON combat_journal (channel_id)",
+    ],
+    # Version 4 : plusieurs combats par canal, journalisés par identifiant de session.
+    # Il n'y avait qu'un combat par canal : sa dernière ligne lui sert d'identifiant.
+    [
+        "DELETE FROM combat_journal WHERE id NOT IN (SELECT MAX(id) FROM combat_journal GROUP BY channel_id)",
+        "ALTER TABLE combat_journal ADD COLUMN session_id INTEGER",
+        "UPDATE combat_journal SET session_id = id",
+        "CREATE INDEX IF NOT EXISTS idx_combat_journal_session_id ON combat_journal (session_id)",
+    ],
+    # Version 5 : état du bot entre deux lancements (empreinte des commandes slash synchronisées)
+    [
+        """
+        CREATE TABLE IF NOT EXISTS bot_state (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+        """,
+    ],
+]
+
+# Métriques
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+METRIC_HELP = {
+    "rpg_command_seconds": "Durée d'exécution des commandes slash",
+    "rpg_interaction_seconds": "Durée de traitement des boutons et menus des vues",
+    "rpg_db_query_seconds": "Durée des requêtes sur le thread de la base",
+    "rpg_db_wait_seconds": "Attente des requêtes avant leur exécution sur le thread de la base",
+    "rpg_db_rows_total": "Lignes ou objets renvoyés par les requêtes",
+    "rpg_event_loop_lag_seconds": "Retard de réveil de la boucle asyncio",
+}
+
+class Histogram:
+    """Histogramme à seaux fixes, au sens de Prometheus (le = borne supérieure incluse)"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Le dernier seau correspond à +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Borne supérieure du seau contenant le quantile q"""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+class Metrics:
+    """Histogrammes, compteurs et jauges du bot, exposés au format texte de Prometheus.
+
+    Les jauges sont lues au moment de l'export : elles ne coûtent rien
+    tant que personne ne les consulte.
+    """
 
-# Système de base de données (identique)
-class Database:
     def __init__(self):
-        self.conn = sqlite3.connect('discord_rpg.db')
-        self.create_tables()
+        self._histograms: Dict[str, Dict[Tuple, Histogram]] = {}
+        self._counters: Dict[str, Dict[Tuple, float]] = {}
+        self._gauges: Dict[str, Tuple[str, str, Callable[[], Dict[str, float]]]] = {}
+        self._started: Dict[int, float] = {}
+        self.loop_lag = 0.0
+        self._lag_task = None
+        self._server = None
+
+    def observe(self, name: str, value: float, **labels):
+        family = self._histograms.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        histogram = family.get(key)
+        if histogram is None:
+            histogram = family[key] = Histogram()
+        histogram.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        family = self._counters.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        family[key] = family.get(key, 0) + value
+
+    def gauge(self, name: str, help: str, label: str, collect: Callable[[], Dict[str, float]]):
+        """Jauge dont `collect()` renvoie {valeur du label: mesure}"""
+        self._gauges[name] = (help, label, collect)
+
+    def histograms(self, name: str) -> Dict[Tuple, Histogram]:
+        return self._histograms.get(name, {})
+
+    # Durée des commandes slash, entre les hooks before_invoke et after_invoke
+    def command_started(self, interaction_id: int):
+        self._started[interaction_id] = time.perf_counter()
+
+    def command_finished(self, interaction_id: int, command: str):
+        started = self._started.pop(interaction_id, None)
+        if started is not None:
+            self.observe("rpg_command_seconds", time.perf_counter() - started, command=command)
+
+    @staticmethod
+    def _labels(key: Tuple) -> str:
+        if not key:
+            return ""
+        return "{" + ",".join(f'{name}="{value}"' for name, value in key) + "}"
+
+    def render(self) -> str:
+        lines = []
+        for name, family in sorted(self._histograms.items()):
+            lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, histogram in sorted(family.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{name}_bucket{self._labels(key + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{self._labels(key)} {histogram.sum}")
+                lines.append(f"{name}_count{self._labels(key)} {histogram.count}")
+        for name, family in sorted(self._counters.items()):
+            lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} counter")
+            for key, value in sorted(family.items()):
+                lines.append(f"{name}{self._labels(key)} {value}")
+        for name, (help, label, collect) in sorted(self._gauges.items()):
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} gauge")
+            for value_label, value in collect().items():
+                lines.append(f"{name}{self._labels(((label, value_label),))} {value}")
+        return "\n".join(lines) + "\n"
+
+    async def _probe_loop_lag(self, interval: float):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(interval)
+            self.loop_lag = max(0.0, loop.time() - start - interval)
+            self.observe("rpg_event_loop_lag_seconds", self.loop_lag)
+
+    async def _handle_http(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[1].split("?")[0] == "/metrics":
+                status, body = "200 OK", self.render()
+            else:
+                status, body = "404 Not Found", "Not found\n"
+            payload = body.encode("utf-8")
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode("latin-1") + payload
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, port: int = METRICS_PORT, host: str = METRICS_HOST,
+                    lag_interval: float = LOOP_LAG_INTERVAL):
+        """Lancer la sonde de retard de la boucle et, si un port est donné, le serveur HTTP"""
+        if self._lag_task is None or self._lag_task.done():
+            self._lag_task = asyncio.get_running_loop().create_task(self._probe_loop_lag(lag_interval))
+        if port and self._server is None:
+            self._server = await asyncio.start_server(self._handle_http, host, port)
+            print(f"📈 Métriques Prometheus sur http://{host}:{port}/metrics")
+
+metrics = Metrics()
+
+# Surveillance des blocages de la boucle
+class LoopWatchdog:
+    """Thread qui détecte les moments où la boucle asyncio ne tourne plus.
+
+    Une tâche de la boucle note l'heure à chaque tour ; si cette heure n'avance
+    plus pendant `threshold` secondes, le thread capture la pile du thread de la
+    boucle, la journalise avec le nom de la tâche en cours (commande ou bouton)
+    et compte le blocage sous la ligne du bot la plus profonde de cette pile.
+    """
+
+    def __init__(self, threshold: float = WATCHDOG_THRESHOLD):
+        self.threshold = threshold
+        self.blocks: Counter = Counter()  # "fonction (fichier:ligne)" -> nombre de blocages
+        self.longest = 0.0
+        self._last_tick = time.monotonic()
+        self._loop = None
+        self._loop_thread_id = None
+        self._tick_task = None
+        self._thread = None
+
+    @staticmethod
+    def label(name: str):
+        """Nommer la tâche en cours pour que ses blocages soient attribués à cette action"""
+        task = asyncio.current_task()
+        if task is not None:
+            task.set_name(name)
+
+    async def _tick_loop(self):
+        interval = self.threshold / 4
+        while True:
+            self._last_tick = time.monotonic()
+            await asyncio.sleep(interval)
+
+    def _call_site(self, stack: traceback.StackSummary) -> str:
+        """Ligne de ce fichier la plus proche du blocage, à défaut la plus profonde de la pile"""
+        for frame in reversed(stack):
+            if frame.filename == __file__:
+                return f"{frame.name} ({os.path.basename(frame.filename)}:{frame.lineno})"
+        frame = stack[-1]
+        return f"{frame.name} ({os.path.basename(frame.filename)}:{frame.lineno})"
+
+    def _report(self, stalled: float):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return
+        stack = traceback.extract_stack(frame)
+        site = self._call_site(stack)
+        self.blocks[site] += 1
+
+        task = asyncio.current_task(self._loop)
+        task_name = task.get_name() if task is not None else "rappel de la boucle"
+        # Les cadres de la boucle elle-même (run_forever, _run_once...) n'apprennent rien
+        handler_frames = [frame for frame in stack if os.sep + "asyncio" + os.sep not in frame.filename]
+        print(f"🐢 Boucle bloquée depuis {stalled * 1000:.0f} ms pendant « {task_name} », dans {site} :\n"
+              + "".join(traceback.format_list(handler_frames)))
+
+    def _watch(self):
+        reported_tick = None
+        while True:
+            time.sleep(self.threshold / 2)
+            tick = self._last_tick
+            stalled = time.monotonic() - tick
+            if stalled > self.threshold:
+                self.longest = max(self.longest, stalled)
+                if tick != reported_tick:  # Un seul rapport par blocage
+                    reported_tick = tick
+                    self._report(stalled)
+
+    def start(self):
+        """À appeler depuis la boucle à surveiller"""
+        if not self.threshold or self._thread is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._tick_task = self._loop.create_task(self._tick_loop())
+        self._thread = threading.Thread(target=self._watch, name="rpg-watchdog", daemon=True)
+        self._thread.start()
 
-    def create_tables(self):
-        cursor = self.conn.cursor()
+watchdog = LoopWatchdog()
 
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS characters (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                owner_id INTEGER NOT NULL,
-                hp INTEGER DEFAULT 1000,
-                max_hp INTEGER DEFAULT 1000,
-                power_gauge REAL DEFAULT 100.0,
-                talent TEXT NOT NULL,
-                level INTEGER DEFAULT 1,
-                experience INTEGER DEFAULT 0,
-                UNIQUE(name, owner_id)
-            )
-        """)
+class StartupTimer:
+    """Étapes du démarrage (connexion, commandes, prêt, première réponse), en secondes depuis le lancement"""
 
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS skills (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                character_id INTEGER NOT NULL,
-                name TEXT NOT NULL,
-                effect TEXT NOT NULL,
-                category TEXT NOT NULL,
-                FOREIGN KEY (character_id) REFERENCES characters (id)
-            )
-        """)
+    def __init__(self, started: float = STARTED_AT):
+        self.started = started
+        self.phases: Dict[str, float] = {}
 
-        self.conn.commit()
+    def mark(self, phase: str, detail: str = "") -> bool:
+        """Noter et afficher la première occurrence d'une étape ; False si elle est déjà notée"""
+        if phase in self.phases:
+            return False
+        elapsed = time.monotonic() - self.started
+        self.phases[phase] = elapsed
+        print(f"⏱️ Démarrage : {phase} après {elapsed:.2f}s{detail}")
+        return True
+
+startup = StartupTimer()
+
+class TimedView(discord.ui.View):
+    """Vue dont chaque bouton ou menu alimente l'histogramme rpg_interaction_seconds"""
+
+    async def _scheduled_task(self, item: discord.ui.Item, interaction: discord.Interaction):
+        watchdog.label(f"{type(self).__name__}:{getattr(item, 'label', None) or type(item).__name__}")
+        start = time.perf_counter()
+        try:
+            return await super()._scheduled_task(item, interaction)
+        finally:
+            metrics.observe("rpg_interaction_seconds", time.perf_counter() - start,
+                            view=type(self).__name__, item=getattr(item, "label", None) or type(item).__name__)
+            startup.mark("premiere_reponse", f" ({type(self).__name__})")
+
+# Système de base de données (identique)
+class Database:
+    def __init__(self, path: str = DB_PATH):
+        self.conn = sqlite3.connect(path)
+        self.configure_connection()
+        self.migrate()
+
+    def configure_connection(self):
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.execute("PRAGMA foreign_keys = ON")
+
+    def get_schema_version(self) -> int:
+        return self.conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def migrate(self):
+        """Appliquer les migrations manquantes, chacune dans sa propre transaction"""
+        current_version = self.get_schema_version()
+
+        for version, statements in enumerate(SCHEMA_MIGRATIONS, 1):
+            if version <= current_version:
+                continue
+
+            try:
+                self.conn.execute("BEGIN")
+                for statement in statements:
+                    self.conn.execute(statement)
+                self.conn.execute(f"PRAGMA user_version = {version}")
+                self.conn.commit()
+            except sqlite3.Error:
+                self.conn.rollback()
+                raise
+
+            print(f"🗄️ Base de données migrée vers la version {version}")
 
     def save_character(self, character: Character) -> int:
         cursor = self.conn.cursor()
@@ -211,35 +806,93 @@ class Database:
                     INSERT INTO skills (character_id, name, effect, category)
                     VALUES (?, ?, ?, ?)
                 """, (character_id, skill.name, skill.effect, skill.category.value))
+                skill.db_id = cursor.lastrowid
 
             self.conn.commit()
+            character.db_id = character_id
             return character_id
         except sqlite3.IntegrityError:
             return None
 
     def update_character(self, character: Character):
+        self.update_characters([character])
+
+    def update_characters(self, characters: List[Character], progress_only: List[Character] = ()):
+        """Sauvegarder plusieurs personnages dans une seule transaction"""
         cursor = self.conn.cursor()
 
+        try:
+            for character in characters:
+                self._write_character(cursor, character)
+            for character in progress_only:
+                self._write_progress(cursor, character)
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+
+    def update_progress(self, character: Character):
+        """Écrire uniquement niveau, expérience, PV et jauge de pouvoir"""
+        self.update_characters([], progress_only=[character])
+
+    def _get_character_id(self, cursor, character: Character) -> int:
+        if character.db_id is None:
+            cursor.execute("SELECT id FROM characters WHERE name = ? AND owner_id = ?", 
+                          (character.name, character.owner_id))
+            character.db_id = cursor.fetchone()[0]
+        return character.db_id
+
+    def _write_progress(self, cursor, character: Character):
+        cursor.execute("""
+            UPDATE characters SET level = ?, experience = ?, hp = ?, power_gauge = ?
+            WHERE id = ?
+        """, (character.level, character.experience, character.hp, character.power_gauge,
+              self._get_character_id(cursor, character)))
+
+    def _write_character(self, cursor, character: Character):
+        char_id = self._get_character_id(cursor, character)
+
         cursor.execute("""
             UPDATE characters 
             SET hp = ?, max_hp = ?, power_gauge = ?, talent = ?, level = ?, experience = ?
-            WHERE name = ? AND owner_id = ?
+            WHERE id = ?
         """, (character.hp, character.max_hp, character.power_gauge, character.talent.value, 
-              character.level, character.experience, character.name, character.owner_id))
-
-        cursor.execute("SELECT id FROM characters WHERE name = ? AND owner_id = ?", 
-                      (character.name, character.owner_id))
-        char_id = cursor.fetchone()[0]
-
-        cursor.execute("DELETE FROM skills WHERE character_id = ?", (char_id,))
-
-        for skill in character.skills:
-            cursor.execute("""
-                INSERT INTO skills (character_id, name, effect, category)
-                VALUES (?, ?, ?, ?)
-            """, (char_id, skill.name, skill.effect, skill.category.value))
+              character.level, character.experience, char_id))
+
+        self._write_skills(cursor, char_id, character.skills)
+
+    def _write_skills(self, cursor, char_id: int, skills: List[Skill]):
+        """Ne toucher que les compétences ajoutées, supprimées ou modifiées"""
+        cursor.execute("SELECT id, name, effect, category FROM skills WHERE character_id = ?", (char_id,))
+        stored = {row[0]: row[1:] for row in cursor.fetchall()}
+
+        unmatched = []
+        for skill in skills:
+            values = (skill.name, skill.effect, skill.category.value)
+            if skill.db_id in stored:
+                if stored.pop(skill.db_id) != values:
+                    cursor.execute("UPDATE skills SET name = ?, effect = ?, category = ? WHERE id = ?",
+                                  values + (skill.db_id,))
+            else:
+                unmatched.append(skill)
+
+        # Les compétences sans identifiant connu reprennent une ligne identique si elle existe
+        remaining = {values: skill_id for skill_id, values in stored.items()}
+        for skill in unmatched:
+            values = (skill.name, skill.effect, skill.category.value)
+            skill_id = remaining.pop(values, None)
+            if skill_id is not None:
+                del stored[skill_id]
+                skill.db_id = skill_id
+            else:
+                cursor.execute("""
+                    INSERT INTO skills (character_id, name, effect, category)
+                    VALUES (?, ?, ?, ?)
+                """, (char_id, skill.name, skill.effect, skill.category.value))
+                skill.db_id = cursor.lastrowid
 
-        self.conn.commit()
+        if stored:
+            cursor.executemany("DELETE FROM skills WHERE id = ?", [(skill_id,) for skill_id in stored])
 
     def get_character(self, name: str, owner_id: int) -> Optional[Character]:
         cursor = self.conn.cursor()
@@ -253,11 +906,11 @@ class Database:
             return None
 
         cursor.execute("""
-            SELECT name, effect, category FROM skills WHERE character_id = ?
+            SELECT id, name, effect, category FROM skills WHERE character_id = ?
         """, (char_data[0],))
 
         skills_data = cursor.fetchall()
-        skills = [Skill(name=s[0], effect=s[1], category=SkillCategory(s[2])) 
+        skills = [Skill(name=s[1], effect=s[2], category=SkillCategory(s[3]), db_id=s[0]) 
                  for s in skills_data]
 
         return Character(
@@ -269,7 +922,8 @@ class Database:
             talent=Talent(char_data[6]),
             level=char_data[7],
             experience=char_data[8],
-            skills=skills
+            skills=skills,
+            db_id=char_data[0]
         )
 
     def get_character_by_name_any_owner(self, name: str) -> Optional[Character]:
@@ -282,11 +936,11 @@ class Database:
             return None
 
         cursor.execute("""
-            SELECT name, effect, category FROM skills WHERE character_id = ?
+            SELECT id, name, effect, category FROM skills WHERE character_id = ?
         """, (char_data[0],))
 
         skills_data = cursor.fetchall()
-        skills = [Skill(name=s[0], effect=s[1], category=SkillCategory(s[2])) 
+        skills = [Skill(name=s[1], effect=s[2], category=SkillCategory(s[3]), db_id=s[0]) 
                  for s in skills_data]
 
         return Character(
@@ -298,37 +952,61 @@ class Database:
             talent=Talent(char_data[6]),
             level=char_data[7],
             experience=char_data[8],
-            skills=skills
+            skills=skills,
+            db_id=char_data[0]
         )
 
     def get_all_characters(self, owner_id: int) -> List[Character]:
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM characters WHERE owner_id = ?", (owner_id,))
+        return self.get_characters_for_owners([owner_id]).get(owner_id, [])
 
-        characters = []
-        for char_data in cursor.fetchall():
-            cursor.execute("""
-                SELECT name, effect, category FROM skills WHERE character_id = ?
-            """, (char_data[0],))
-
-            skills_data = cursor.fetchall()
-            skills = [Skill(name=s[0], effect=s[1], category=SkillCategory(s[2])) 
-                     for s in skills_data]
-
-            character = Character(
-                name=char_data[1],
-                owner_id=char_data[2],
-                hp=char_data[3],
-                max_hp=char_data[4],
-                power_gauge=char_data[5],
-                talent=Talent(char_data[6]),
-                level=char_data[7],
-                experience=char_data[8],
-                skills=skills
-            )
-            characters.append(character)
+    def get_character_names(self, owner_id: int) -> List[str]:
+        return [row[0] for row in self.conn.execute("SELECT name FROM characters WHERE owner_id = ?", (owner_id,))]
 
-        return characters
+    def get_characters_for_owners(self, owner_ids: List[int]) -> Dict[int, List[Character]]:
+        """Charger les personnages et compétences de plusieurs joueurs en une requête par lot"""
+        cursor = self.conn.cursor()
+        result = {}
+        owner_ids = list(dict.fromkeys(owner_ids))
+
+        for start in range(0, len(owner_ids), SQL_BATCH_SIZE):
+            batch = owner_ids[start:start + SQL_BATCH_SIZE]
+            placeholders = ", ".join("?" * len(batch))
+            cursor.execute(f"""
+                SELECT c.id, c.name, c.owner_id, c.hp, c.max_hp, c.power_gauge, c.talent,
+                       c.level, c.experience, s.id, s.name, s.effect, s.category
+                FROM characters c
+                LEFT JOIN skills s ON s.character_id = c.id
+                WHERE c.owner_id IN ({placeholders})
+                ORDER BY c.id, s.id
+            """, batch)
+
+            characters_by_id = {}
+            for row in cursor.fetchall():
+                character = characters_by_id.get(row[0])
+                if character is None:
+                    character = Character(
+                        name=row[1],
+                        owner_id=row[2],
+                        hp=row[3],
+                        max_hp=row[4],
+                        power_gauge=row[5],
+                        talent=Talent(row[6]),
+                        level=row[7],
+                        experience=row[8],
+                        db_id=row[0]
+                    )
+                    characters_by_id[row[0]] = character
+                    result.setdefault(character.owner_id, []).append(character)
+                if row[9] is not None:
+                    character.skills.append(Skill(name=row[10], effect=row[11], category=SkillCategory(row[12]),
+                                                  db_id=row[9]))
+
+        return result
+
+    def has_any_character(self, owner_id: int) -> bool:
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT 1 FROM characters WHERE owner_id = ? LIMIT 1", (owner_id,))
+        return cursor.fetchone() is not None
 
     def delete_character(self, name: str, owner_id: int):
         cursor = self.conn.cursor()
@@ -342,24 +1020,556 @@ class Database:
             cursor.execute("DELETE FROM characters WHERE id = ?", (char_id,))
             self.conn.commit()
 
+    def get_leaderboard(self, critere: str, limit: int = 10) -> List[Tuple]:
+        """Lignes (id, name, owner_id, level, experience, talent) triées selon le critère"""
+        cursor = self.conn.cursor()
+
+        if critere == "niveau":
+            cursor.execute("""
+                SELECT id, name, owner_id, level, experience, talent FROM characters 
+                ORDER BY level DESC, experience DESC, id LIMIT ?
+            """, (limit,))
+        else:
+            cursor.execute("""
+                SELECT id, name, owner_id, level, experience, talent FROM characters 
+                ORDER BY experience DESC, id LIMIT ?
+            """, (limit,))
+
+        return cursor.fetchall()
+
+    def append_combat_snapshot(self, session_id: int, channel_id: int, turn_count: int, state: str):
+        self.conn.execute(
+            "INSERT INTO combat_journal (session_id, channel_id, turn_count, state) VALUES (?, ?, ?, ?)",
+            (session_id, channel_id, turn_count, state)
+        )
+        self.conn.commit()
+
+    def delete_combat_snapshots(self, session_id: int):
+        self.conn.execute("DELETE FROM combat_journal WHERE session_id = ?", (session_id,))
+        self.conn.commit()
+
+    def get_latest_combat_snapshots(self) -> List[Tuple[int, int, str]]:
+        """Dernier état (session_id, channel_id, state) de chaque combat journalisé ; les plus anciens sont purgés"""
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            DELETE FROM combat_journal
+            WHERE id NOT IN (SELECT MAX(id) FROM combat_journal GROUP BY session_id)
+        """)
+        self.conn.commit()
+        cursor.execute("SELECT session_id, channel_id, state FROM combat_journal ORDER BY id")
+        return cursor.fetchall()
+
+    def get_state(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM bot_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_state(self, key: str, value: str):
+        self.conn.execute("INSERT OR REPLACE INTO bot_state (key, value) VALUES (?, ?)", (key, value))
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+# Accès asynchrone à la base de données
+class AsyncDatabase:
+    """Façade asynchrone de Database.
+
+    Toutes les requêtes sont exécutées sur un unique thread dédié : la boucle
+    asyncio n'est jamais bloquée par sqlite3 et les écritures restent
+    sérialisées sur une seule connexion.
+    """
+
+    def __init__(self, path: str = DB_PATH):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rpg-db")
+        # La connexion est créée dans le thread qui l'utilisera
+        self._db = self._executor.submit(Database, path).result()
+
+    @staticmethod
+    def _timed(func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        return result, time.perf_counter() - start
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        submitted = time.perf_counter()
+        result, elapsed = await loop.run_in_executor(self._executor, functools.partial(self._timed, func, *args))
+
+        method = func.__name__
+        metrics.observe("rpg_db_query_seconds", elapsed, method=method)
+        metrics.observe("rpg_db_wait_seconds", max(0.0, time.perf_counter() - submitted - elapsed), method=method)
+        if isinstance(result, (list, dict)):
+            metrics.inc("rpg_db_rows_total", len(result), method=method)
+        elif result is not None:
+            metrics.inc("rpg_db_rows_total", 1, method=method)
+        return result
+
+    async def save_character(self, character: Character) -> Optional[int]:
+        return await self._run(self._db.save_character, character)
+
+    async def update_character(self, character: Character):
+        return await self._run(self._db.update_character, character)
+
+    async def update_characters(self, characters: List[Character], progress_only: List[Character] = ()):
+        return await self._run(self._db.update_characters, characters, progress_only)
+
+    async def update_progress(self, character: Character):
+        return await self._run(self._db.update_progress, character)
+
+    async def get_character(self, name: str, owner_id: int) -> Optional[Character]:
+        return await self._run(self._db.get_character, name, owner_id)
+
+    async def get_character_by_name_any_owner(self, name: str) -> Optional[Character]:
+        return await self._run(self._db.get_character_by_name_any_owner, name)
+
+    async def get_all_characters(self, owner_id: int) -> List[Character]:
+        return await self._run(self._db.get_all_characters, owner_id)
+
+    async def get_character_names(self, owner_id: int) -> List[str]:
+        return await self._run(self._db.get_character_names, owner_id)
+
+    async def get_characters_for_owners(self, owner_ids: List[int]) -> Dict[int, List[Character]]:
+        return await self._run(self._db.get_characters_for_owners, owner_ids)
+
+    async def has_any_character(self, owner_id: int) -> bool:
+        return await self._run(self._db.has_any_character, owner_id)
+
+    async def delete_character(self, name: str, owner_id: int):
+        return await self._run(self._db.delete_character, name, owner_id)
+
+    async def get_leaderboard(self, critere: str, limit: int = 10) -> List[Tuple]:
+        return await self._run(self._db.get_leaderboard, critere, limit)
+
+    async def append_combat_snapshot(self, session_id: int, channel_id: int, turn_count: int, state: str):
+        return await self._run(self._db.append_combat_snapshot, session_id, channel_id, turn_count, state)
+
+    async def delete_combat_snapshots(self, session_id: int):
+        return await self._run(self._db.delete_combat_snapshots, session_id)
+
+    async def get_latest_combat_snapshots(self) -> List[Tuple[int, int, str]]:
+        return await self._run(self._db.get_latest_combat_snapshots)
+
+    async def get_state(self, key: str) -> Optional[str]:
+        return await self._run(self._db.get_state, key)
+
+    async def set_state(self, key: str, value: str):
+        return await self._run(self._db.set_state, key, value)
+
+    def close(self):
+        self._executor.submit(self._db.close).result()
+        self._executor.shutdown(wait=True)
+
+# Cache des personnages en écriture différée
+class CharacterCache:
+    """Identity map des personnages, indexée par (owner_id, nom).
+
+    Les lectures des personnages récents sont de simples recherches dans un
+    dictionnaire (LRU de taille bornée). Les modifications marquent l'entrée
+    comme sale et sont écrites par lot, dans une seule transaction, par une
+    tâche de fond ou à l'arrêt du bot.
+    """
+
+    def __init__(self, database: AsyncDatabase, max_size: int = CACHE_SIZE,
+                 flush_interval: float = CACHE_FLUSH_INTERVAL, names: "CharacterNameIndex" = None):
+        self.database = database
+        self.max_size = max_size
+        # Index des noms pour l'autocomplétion, tenu à jour par les créations et suppressions
+        self.names = names
+        self.flush_interval = flush_interval
+        self._entries: "OrderedDict[Tuple[int, str], Character]" = OrderedDict()
+        # Les entrées sales restent ici jusqu'à leur écriture, même si le LRU les évince
+        self._dirty: Dict[Tuple[int, str], Character] = {}
+        # Sous-ensemble de _dirty dont seule la progression a changé
+        self._progress_only = set()
+        self._flush_task = None
+        self._flush_lock = asyncio.Lock()
+
+    def _remember(self, character: Character) -> Character:
+        key = (character.owner_id, character.name)
+        self._entries[key] = character
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return character
+
+    def _lookup(self, owner_id: int, name: str) -> Optional[Character]:
+        key = (owner_id, name)
+        character = self._entries.get(key)
+        if character is not None:
+            self._entries.move_to_end(key)
+            return character
+        character = self._dirty.get(key)
+        if character is not None:
+            return self._remember(character)
+        return None
+
+    async def get_character(self, name: str, owner_id: int) -> Optional[Character]:
+        character = self._lookup(owner_id, name)
+        if character is not None:
+            return character
+
+        character = await self.database.get_character(name, owner_id)
+        if character is None:
+            return None
+        # Une autre coroutine a pu charger le personnage pendant l'attente
+        return self._lookup(owner_id, name) or self._remember(character)
+
+    async def get_all_characters(self, owner_id: int) -> List[Character]:
+        characters = await self.database.get_all_characters(owner_id)
+        return [self._lookup(owner_id, character.name) or self._remember(character)
+                for character in characters]
+
+    async def save_character(self, character: Character) -> Optional[int]:
+        # Les créations sont écrites immédiatement pour détecter les doublons
+        char_id = await self.database.save_character(character)
+        if char_id:
+            self._remember(character)
+            if self.names is not None:
+                self.names.add(character.owner_id, character.name)
+        return char_id
+
+    def _mark_dirty(self, character: Character, progress_only: bool) -> Character:
+        cached = self._lookup(character.owner_id, character.name)
+        if cached is None:
+            cached = self._remember(character)
+        key = (cached.owner_id, cached.name)
+        if progress_only and (key not in self._dirty or key in self._progress_only):
+            self._progress_only.add(key)
+        else:
+            self._progress_only.discard(key)
+        self._dirty[key] = cached
+        return cached
+
+    def update_character(self, character: Character):
+        """Appliquer toutes les données d'un personnage et planifier son écriture"""
+        cached = self._mark_dirty(character, progress_only=False)
+        if cached is not character:
+            cached.max_hp = character.max_hp
+            cached.talent = character.talent
+            cached.skills = [Skill(name=s.name, effect=s.effect, category=s.category, db_id=s.db_id)
+                             for s in character.skills]
+            self._copy_progress(character, cached)
+
+    def update_progress(self, character: Character):
+        """Appliquer la progression d'un personnage (niveau, XP, PV, pouvoir) et planifier son écriture"""
+        cached = self._mark_dirty(character, progress_only=True)
+        if cached is not character:
+            self._copy_progress(character, cached)
+
+    @staticmethod
+    def _copy_progress(source: Character, target: Character):
+        target.hp = source.hp
+        target.power_gauge = source.power_gauge
+        target.level = source.level
+        target.experience = source.experience
+        if target.db_id is None:
+            target.db_id = source.db_id
+
+    async def delete_character(self, name: str, owner_id: int):
+        self._entries.pop((owner_id, name), None)
+        self._dirty.pop((owner_id, name), None)
+        self._progress_only.discard((owner_id, name))
+        await self.database.delete_character(name, owner_id)
+        if self.names is not None:
+            self.names.remove(owner_id, name)
+
+    @property
+    def dirty_count(self) -> int:
+        return len(self._dirty)
+
+    def recent(self, limit: int) -> List[Character]:
+        """Les `limit` personnages utilisés le plus récemment, du plus ancien au plus récent"""
+        entries = list(self._entries.values())
+        return entries[max(0, len(entries) - limit):]
+
+    def warm(self, characters: List[Character]):
+        """Précharger des personnages déjà écrits en base, sans remplacer ceux chargés entre-temps"""
+        for character in characters:
+            if self._lookup(character.owner_id, character.name) is None:
+                self._remember(character)
+
+    async def flush(self):
+        """Écrire toutes les entrées sales dans une seule transaction"""
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+
+            pending, progress_only = self._dirty, self._progress_only
+            self._dirty, self._progress_only = {}, set()
+            # Instantané pris sur la boucle : le thread de la base ne lit jamais d'objet partagé
+            full = [copy.deepcopy(character) for key, character in pending.items()
+                    if key not in progress_only]
+            progress = [copy.deepcopy(character) for key, character in pending.items()
+                        if key in progress_only]
+
+            try:
+                await self.database.update_characters(full, progress)
+            except Exception:
+                for key, character in pending.items():
+                    if key not in self._dirty:
+                        self._dirty[key] = character
+                        if key in progress_only:
+                            self._progress_only.add(key)
+                raise
+
+            # Reporter les identifiants attribués aux nouvelles compétences sur les instances du cache
+            for written in full:
+                cached = pending[(written.owner_id, written.name)]
+                for cached_skill, written_skill in zip(cached.skills, written.skills):
+                    if cached_skill.db_id is None and cached_skill.name == written_skill.name:
+                        cached_skill.db_id = written_skill.db_id
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"❌ Erreur lors de l'écriture du cache: {e}")
+
+    def start(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_loop())
+
+# Noms des personnages pour l'autocomplétion
+class CharacterNameIndex:
+    """Noms des personnages de chaque joueur, triés sans tenir compte de la casse.
+
+    La liste d'un joueur est lue une seule fois en base (noms seuls, par
+    l'index owner_id), puis chaque frappe est servie par une recherche
+    dichotomique en mémoire. Les requêtes passent dans l'ordre par l'unique
+    thread de la base : une liste chargée contient toutes les créations
+    antérieures, et les suivantes lui sont ajoutées par add().
+    """
+
+    def __init__(self, database: AsyncDatabase, max_owners: int = NAME_INDEX_OWNERS):
+        self.database = database
+        self.max_owners = max_owners
+        self._owners: "OrderedDict[int, List[Tuple[str, str]]]" = OrderedDict()  # (nom sans casse, nom)
+        self._loading: Dict[int, asyncio.Task] = {}
+
+    def is_loaded(self, owner_id: int) -> bool:
+        return owner_id in self._owners
+
+    @staticmethod
+    def _position(entries: List[Tuple[str, str]], name: str) -> Tuple[int, bool]:
+        key = (name.casefold(), name)
+        index = bisect.bisect_left(entries, key)
+        return index, index < len(entries) and entries[index] == key
+
+    def may_exist(self, owner_id: int, name: str) -> bool:
+        """Faux seulement si le joueur est indexé et n'a aucun personnage de ce nom"""
+        entries = self._owners.get(owner_id)
+        return entries is None or self._position(entries, name)[1]
+
+    def add(self, owner_id: int, name: str):
+        entries = self._owners.get(owner_id)
+        if entries is not None:
+            index, found = self._position(entries, name)
+            if not found:
+                entries.insert(index, (name.casefold(), name))
+
+    def remove(self, owner_id: int, name: str):
+        entries = self._owners.get(owner_id)
+        if entries is not None:
+            index, found = self._position(entries, name)
+            if found:
+                del entries[index]
+
+    async def load(self, owner_id: int) -> List[Tuple[str, str]]:
+        entries = self._owners.get(owner_id)
+        if entries is not None:
+            self._owners.move_to_end(owner_id)
+            return entries
+
+        # Les frappes rapprochées d'un même joueur partagent la même lecture
+        task = self._loading.get(owner_id)
+        if task is None:
+            task = self._loading[owner_id] = asyncio.get_running_loop().create_task(self._fetch(owner_id))
+            task.add_done_callback(lambda _: self._loading.pop(owner_id, None))
+        return await asyncio.shield(task)
+
+    async def _fetch(self, owner_id: int) -> List[Tuple[str, str]]:
+        names = await self.database.get_character_names(owner_id)
+        entries = self._owners[owner_id] = sorted((name.casefold(), name) for name in names)
+        while len(self._owners) > self.max_owners:
+            self._owners.popitem(last=False)
+        return entries
+
+    async def resolve(self, owner_id: int, value: str) -> str:
+        """Nom désigné par une valeur d'autocomplétion, y compris la référence d'un nom trop long"""
+        if not is_choice_reference(value):
+            return value
+        return resolve_choice(value, (name for _, name in await self.load(owner_id)))
+
+    async def complete(self, owner_id: int, prefix: str, limit: int = AUTOCOMPLETE_LIMIT) -> List[str]:
+        """Noms du joueur commençant par `prefix`, sans tenir compte de la casse"""
+        entries = await self.load(owner_id)
+        folded = prefix.casefold()
+        names = []
+        for index in range(bisect.bisect_left(entries, (folded,)), len(entries)):
+            key, name = entries[index]
+            if not key.startswith(folded) or len(names) == limit:
+                break
+            names.append(name)
+        return names
+
+# Classement maintenu en mémoire
+@dataclass
+class LeaderboardEntry:
+    char_id: int
+    name: str
+    owner_id: int
+    level: int
+    experience: int
+    talent: str
+
+class LeaderboardService:
+    """Classements triés gardés en mémoire pour /classement.
+
+    Chaque critère garde les `depth` meilleurs personnages dans une liste de
+    clés triée (bisect). La base n'est lue qu'au démarrage, ou si la fenêtre
+    se vide trop après des sorties de classement ; les fins de combat mettent
+    les listes à jour incrémentalement. Les embeds rendus sont mis en cache
+    par critère et invalidés uniquement quand le classement change.
+    """
+
+    CRITERIA = ("niveau", "experience")
+
+    def __init__(self, database: AsyncDatabase, depth: int = LEADERBOARD_DEPTH):
+        self.database = database
+        self.depth = depth
+        self._keys = {critere: [] for critere in self.CRITERIA}
+        self._entries = {critere: {} for critere in self.CRITERIA}
+        # Vrai si la base contient des personnages au-delà de la fenêtre gardée
+        self._truncated = {critere: False for critere in self.CRITERIA}
+        self._embeds = {critere: {} for critere in self.CRITERIA}
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+
+    @staticmethod
+    def _sort_key(critere: str, entry: LeaderboardEntry) -> Tuple:
+        # Même ordre que Database.get_leaderboard, départage des ex aequo par identifiant compris
+        if critere == "niveau":
+            return (-entry.level, -entry.experience, entry.char_id)
+        return (-entry.experience, entry.char_id)
+
+    async def load(self, force: bool = False):
+        async with self._load_lock:
+            if self._loaded and not force:
+                return
+
+            for critere in self.CRITERIA:
+                rows = await self.database.get_leaderboard(critere, self.depth + 1)
+                entries = [LeaderboardEntry(*row) for row in rows]
+                self._truncated[critere] = len(entries) > self.depth
+                entries = entries[:self.depth]
+                self._entries[critere] = {entry.char_id: entry for entry in entries}
+                self._keys[critere] = sorted(self._sort_key(critere, entry) for entry in entries)
+                self._embeds[critere].clear()
+
+            self._loaded = True
+
+    def to_snapshot(self) -> Optional[dict]:
+        """Fenêtres gardées de chaque critère, dans l'ordre du classement (None si rien n'est chargé)"""
+        if not self._loaded:
+            return None
+        return {critere: {"truncated": self._truncated[critere],
+                          "entries": [astuple(self._entries[critere][key[-1]]) for key in self._keys[critere]]}
+                for critere in self.CRITERIA}
+
+    def restore(self, data: dict):
+        """Reprendre les classements d'un instantané au lieu de les lire en base"""
+        if self._loaded:
+            return
+        for critere in self.CRITERIA:
+            entries = [LeaderboardEntry(*row) for row in data[critere]["entries"]][:self.depth]
+            self._truncated[critere] = data[critere]["truncated"] or len(entries) < len(data[critere]["entries"])
+            self._entries[critere] = {entry.char_id: entry for entry in entries}
+            self._keys[critere] = sorted(self._sort_key(critere, entry) for entry in entries)
+            self._embeds[critere].clear()
+        self._loaded = True
+
+    def update(self, character: Character):
+        """Reporter la progression d'un personnage dans tous les classements"""
+        if character.db_id is None:
+            return
+
+        entry = LeaderboardEntry(character.db_id, character.name, character.owner_id,
+                                 character.level, character.experience, character.talent.value)
+        for critere in self.CRITERIA:
+            self._update_criterion(critere, entry)
+
+    def _update_criterion(self, critere: str, entry: LeaderboardEntry):
+        keys = self._keys[critere]
+        entries = self._entries[critere]
+
+        old_entry = entries.get(entry.char_id)
+        if old_entry == entry:
+            return
+
+        new_key = self._sort_key(critere, entry)
+        if old_entry is not None:
+            del keys[bisect.bisect_left(keys, self._sort_key(critere, old_entry))]
+            del entries[entry.char_id]
+        elif self._beyond_window(critere, new_key):
+            # Toujours hors de la fenêtre gardée : rien ne change à l'affichage
+            return
+
+        # Une entrée qui sort de la fenêtre est oubliée : des personnages non chargés peuvent la devancer
+        if not self._beyond_window(critere, new_key):
+            bisect.insort(keys, new_key)
+            entries[entry.char_id] = entry
+            if len(keys) > self.depth:
+                dropped_key = keys.pop()
+                del entries[dropped_key[-1]]
+                self._truncated[critere] = True
+
+        self._embeds[critere].clear()
+
+    def _beyond_window(self, critere: str, key: Tuple) -> bool:
+        keys = self._keys[critere]
+        return self._truncated[critere] and bool(keys) and key > keys[-1]
+
+    def _needs_reload(self, critere: str) -> bool:
+        return self._truncated[critere] and len(self._keys[critere]) < self.depth // 2
+
+    async def get_page(self, critere: str, page: int = 1, talent: Optional[str] = None,
+                       owner_filter=None) -> Tuple[List[Tuple[int, LeaderboardEntry]], int]:
+        """Renvoyer les entrées (rang, entrée) d'une page et le nombre total de pages.
+
+        Une page au-delà de la dernière renvoie la dernière page.
+        """
+        await self.load()
+        if self._needs_reload(critere):
+            await self.load(force=True)
+
+        entries = self._entries[critere]
+        ranked = [entries[key[-1]] for key in self._keys[critere]]
+        if talent is not None:
+            ranked = [entry for entry in ranked if entry.talent == talent]
+        if owner_filter is not None:
+            ranked = [entry for entry in ranked if owner_filter(entry.owner_id)]
+
+        total_pages = max(1, -(-len(ranked) // LEADERBOARD_PAGE_SIZE))
+        start = (min(page, total_pages) - 1) * LEADERBOARD_PAGE_SIZE
+        page_entries = ranked[start:start + LEADERBOARD_PAGE_SIZE]
+        return list(enumerate(page_entries, start + 1)), total_pages
+
+    def get_cached_embed(self, critere: str, key: Tuple):
+        return self._embeds[critere].get(key)
+
+    def store_embed(self, critere: str, key: Tuple, embed):
+        self._embeds[critere][key] = embed
+
 # Système de combat (identique)
 class CombatSystem:
-    def __init__(self):
-        self.active_combats = {}
-        self.pending_combats = {}
-
-    def calculate_damage(self, attacker: Character, defender: Character, 
+    def calculate_damage(self, attacker: Fighter, defender: Fighter,
                         is_skill: bool = False, skill_category: SkillCategory = None) -> int:
         base_damage = 100
 
-        talent_modifier = attacker.get_talent_advantage(defender.talent)
-
-        skill_modifier = 1.0
-        if is_skill:
-            if skill_category == SkillCategory.ATTAQUE:
-                skill_modifier = 1.5
-            elif skill_category == SkillCategory.RESTREINTE:
-                skill_modifier = 0.8
+        talent_modifier = TALENT_MATRIX[attacker.talent.ordinal][defender.talent.ordinal]
+        skill_modifier = SKILL_DAMAGE_MULTIPLIERS[skill_category.ordinal if is_skill else NO_SKILL]
 
         bloodlust_modifier = 2.0 if attacker.bloodlust_turns > 0 else 1.0
         weakened_modifier = 0.5 if attacker.weakened_turns > 0 else 1.0
@@ -378,8 +1588,57 @@ class CombatSystem:
 
         return int(damage)
 
-    def use_skill(self, character: Character, skill: Skill, opponent: Character) -> bool:
-        if skill.cooldown > 0:
+    def calculate_damage_batch(self, attacker_talent, defender_talent, skill_category=NO_SKILL,
+                               attacker_bloodlust_turns=0, attacker_weakened_turns=0,
+                               attacker_bonus=1.0, defender_defending=False, defender_malus=1.0,
+                               defender_bloodlust_turns=0, defender_weakened_turns=0):
+        """Version vectorisée de calculate_damage sur des tableaux d'états.
+
+        Les talents et catégories sont des rangs (`.ordinal`), NO_SKILL pour une
+        attaque basique ; les scalaires sont diffusés. Les facteurs sont
+        multipliés dans le même ordre que calculate_damage, donc les résultats
+        sont identiques. Nécessite numpy.
+        """
+        if np is None:
+            raise RuntimeError("calculate_damage_batch nécessite numpy (pip install numpy)")
+
+        talent_modifier = np.asarray(TALENT_MATRIX)[np.asarray(attacker_talent), np.asarray(defender_talent)]
+        skill_modifier = np.asarray(SKILL_DAMAGE_MULTIPLIERS)[np.asarray(skill_category)]
+        bloodlust_modifier = np.where(np.asarray(attacker_bloodlust_turns) > 0, 2.0, 1.0)
+        weakened_modifier = np.where(np.asarray(attacker_weakened_turns) > 0, 0.5, 1.0)
+        defense_modifier = np.where(np.asarray(defender_defending), 0.5, 1.0)
+
+        damage = (100 * talent_modifier * skill_modifier *
+                  bloodlust_modifier * weakened_modifier * np.asarray(attacker_bonus, dtype=float) *
+                  defense_modifier * np.asarray(defender_malus, dtype=float))
+
+        vulnerable = (np.asarray(defender_bloodlust_turns) > 0) | (np.asarray(defender_weakened_turns) > 0)
+        damage = np.where(vulnerable, damage * 2.0, damage)
+
+        return damage.astype(np.int64)
+
+    def apply_attack(self, attacker: Fighter, defender: Fighter, is_skill: bool = False,
+                     skill_category: SkillCategory = None, rng=random) -> Tuple[int, int]:
+        """Infliger une attaque et renvoyer (dégâts, PV récupérés grâce au bloodlust)"""
+        damage = self.calculate_damage(attacker, defender, is_skill, skill_category)
+
+        heal_amount = 0
+        if attacker.bloodlust_turns > 0 and rng.random() < 0.3:
+            heal_amount = int(damage * 0.25)
+            attacker.hp = min(attacker.max_hp, attacker.hp + heal_amount)
+
+        defender.hp = max(0, defender.hp - damage)
+        return damage, heal_amount
+
+    def activate_bloodlust(self, character: Fighter):
+        character.bloodlust_turns = 8
+        character.power_gauge = 100.0
+        character.was_in_bloodlust = True
+
+    def use_skill(self, character: Fighter, index: int, opponent: Fighter) -> bool:
+        """Utiliser la compétence d'indice `index` de character.skills"""
+        skill = character.skills[index]
+        if character.skill_cooldowns[index] > 0:
             return False
 
         if character.power_gauge < skill.get_power_cost():
@@ -394,14 +1653,16 @@ class CombatSystem:
         elif skill.category == SkillCategory.RESTREINTE:
             opponent.skip_next_turn = True
 
-        skill.cooldown = skill.get_cooldown_duration()
+        character.skill_cooldowns[index] = skill.get_cooldown_duration()
 
         return True
 
-    def process_turn_end(self, character: Character):
-        for skill in character.skills:
-            if skill.cooldown > 0:
-                skill.cooldown -= 1
+    def process_turn_end(self, character: Fighter):
+        cooldowns = character.skill_cooldowns
+        if any(cooldowns):
+            for index, cooldown in enumerate(cooldowns):
+                if cooldown > 0:
+                    cooldowns[index] = cooldown - 1
 
         if character.defense_cooldown > 0:
             character.defense_cooldown -= 1
@@ -419,8 +1680,7 @@ class CombatSystem:
             character.weakened_turns -= 1
 
     def check_victory_conditions(self, session: CombatSession) -> Optional[int]:
-        char1 = session.player1_character
-        char2 = session.player2_character
+        char1, char2 = session.fighters
         obj1 = session.player1_objective
         obj2 = session.player2_objective
 
@@ -470,23 +1730,855 @@ class CombatSystem:
 
         return int(base_exp * power_multiplier)
 
+# Contexte minimal pour envoyer les messages d'un combat hors d'une interaction
+class ChannelContext:
+    """Remplace ctx pour un combat repris : ctx.followup.send écrit directement dans le canal"""
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.followup = channel
+
+# Envois sortants : regroupement par action et limitation par canal
+class TokenBucket:
+    """Seau à jetons : `capacity` envois, rechargés en `period` secondes. Les attentes sont servies dans l'ordre."""
+
+    def __init__(self, capacity: int = CHANNEL_RATE_LIMIT, period: float = CHANNEL_RATE_PERIOD):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.waiting = 0
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def is_idle(self) -> bool:
+        self._refill()
+        return self.waiting == 0 and self.tokens >= self.capacity
+
+    async def acquire(self) -> float:
+        """Prendre un jeton ; renvoie le temps d'attente en secondes"""
+        self.waiting += 1
+        start = time.monotonic()
+        try:
+            async with self._lock:
+                self._refill()
+                if self.tokens < 1:
+                    await asyncio.sleep((1 - self.tokens) / self.rate)
+                    self._refill()
+                self.tokens -= 1
+        finally:
+            self.waiting -= 1
+        return time.monotonic() - start
+
+class OutboundDispatcher:
+    """Point de passage des messages du bot vers les canaux de combat.
+
+    Les messages produits pendant une même action sont mis en tampon puis
+    fusionnés en un seul envoi ; chaque envoi ou modification attend un jeton
+    du seau de son canal pour ne pas déclencher de 429.
+    """
+
+    MAX_IDLE_BUCKETS = 1000
+
+    def __init__(self, capacity: int = CHANNEL_RATE_LIMIT, period: float = CHANNEL_RATE_PERIOD):
+        self.capacity = capacity
+        self.period = period
+        self._buckets: Dict[int, TokenBucket] = {}
+        self.sent = 0
+        self.coalesced = 0
+        self.throttled = 0
+        self.wait_time = 0.0
+
+    def _bucket(self, channel_id: int) -> TokenBucket:
+        bucket = self._buckets.get(channel_id)
+        if bucket is None:
+            if len(self._buckets) >= self.MAX_IDLE_BUCKETS:
+                for idle_id in [cid for cid, b in self._buckets.items() if b.is_idle()]:
+                    del self._buckets[idle_id]
+            bucket = self._buckets[channel_id] = TokenBucket(self.capacity, self.period)
+        return bucket
+
+    async def throttle(self, channel_id: int):
+        """Attendre le droit d'émettre une requête sur ce canal"""
+        waited = await self._bucket(channel_id).acquire()
+        self.sent += 1
+        if waited > 0.001:
+            self.throttled += 1
+            self.wait_time += waited
+
+    def queue_depth(self, channel_id: Optional[int] = None) -> int:
+        if channel_id is not None:
+            bucket = self._buckets.get(channel_id)
+            return bucket.waiting if bucket else 0
+        return sum(bucket.waiting for bucket in self._buckets.values())
+
+    def metrics(self) -> Dict[str, float]:
+        return {
+            "queue_depth": self.queue_depth(),
+            "channels": len(self._buckets),
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "throttled": self.throttled,
+            "wait_seconds": self.wait_time,
+        }
+
+    def coalesce(self, ctx) -> "CoalescingContext":
+        return CoalescingContext(ctx, self)
+
+    async def update_board(self, ctx, session, contents: List[str], embeds: List[discord.Embed],
+                           board: Optional[discord.Embed], attach_view: bool, close: bool):
+        """Ajouter une action à la modification en attente du tableau du combat et attendre son envoi.
+
+        Les modifications d'un combat partent dans l'ordre, une à la fois ; les
+        actions appliquées pendant l'attente d'un jeton rejoignent celle qui
+        attend, qui ne coûte toujours qu'une requête.
+        """
+        update = session.board_update
+        if update is None:
+            update = session.board_update = BoardUpdate()
+            previous, session.board_delivered = session.board_delivered, update.done
+            asyncio.get_running_loop().create_task(self._deliver(session, update, previous))
+        else:
+            self.coalesced += 1
+        update.merge(ctx, contents, embeds, board, attach_view, close)
+        await asyncio.shield(update.done)
+
+    async def _deliver(self, session, update: "BoardUpdate", previous: Optional[asyncio.Future]):
+        try:
+            if previous is not None:
+                await asyncio.wait([previous])
+            await self.throttle(session.channel_id)
+            # Jeton obtenu : les actions suivantes forment une nouvelle modification
+            if session.board_update is update:
+                session.board_update = None
+            await publish_board(session, update)
+        except Exception as e:
+            if session.board_update is update:
+                session.board_update = None
+            update.done.set_exception(e)
+        else:
+            update.done.set_result(None)
+
+def pack_messages(contents: List[str], embeds: List[discord.Embed],
+                  max_embeds: int = MAX_EMBEDS_PER_MESSAGE) -> List[Tuple[Optional[str], List[discord.Embed]]]:
+    """Regrouper textes et embeds en aussi peu de messages que les limites de Discord le permettent"""
+    chunks = []
+    for content in contents:
+        if chunks and len(chunks[-1]) + 1 + len(content) <= MAX_MESSAGE_LENGTH:
+            chunks[-1] += "\n" + content
+        else:
+            chunks.append(content)
+
+    messages = [(chunk, []) for chunk in chunks] or [(None, [])]
+    for start in range(0, len(embeds), max_embeds):
+        batch = embeds[start:start + max_embeds]
+        if start == 0:
+            messages[-1] = (messages[-1][0], batch)
+        else:
+            messages.append((None, batch))
+    return messages
+
+class BoardUpdate:
+    """Modification du tableau d'un combat en attente d'envoi, complétée par les actions qui la rejoignent"""
+
+    def __init__(self):
+        self.ctx = None  # Contexte de la dernière action : son jeton d'interaction est le plus récent
+        self.contents: List[str] = []
+        self.embeds: List[discord.Embed] = []
+        self.board: Optional[discord.Embed] = None  # Dernier état du combat
+        self.attach_view = False
+        self.close = False
+        self.done = asyncio.get_running_loop().create_future()
+
+    def merge(self, ctx, contents: List[str], embeds: List[discord.Embed], board: Optional[discord.Embed],
+              attach_view: bool, close: bool):
+        self.ctx = ctx
+        self.contents.extend(contents)
+        self.embeds.extend(embeds)
+        if board is not None:
+            self.board = board
+        self.attach_view = self.attach_view or attach_view
+        if close:
+            self.close = True
+            self.board = None
+
+class CoalescingContext:
+    """Remplace ctx pendant une action : ctx.followup.send est mis en tampon jusqu'à la sortie du bloc.
+
+        async with outbound.coalesce(ctx) as ctx:
+            await basic_attack_action(ctx, session, user_id)
+    """
+
+    def __init__(self, ctx, dispatcher: OutboundDispatcher):
+        self._ctx = ctx
+        self._dispatcher = dispatcher
+        self._contents: List[str] = []
+        self._embeds: List[discord.Embed] = []
+        # Tableau de combat à modifier avec les messages de l'action (show_board, close_board)
+        self._session = None
+        self._board: Optional[discord.Embed] = None
+        self._attach_view = False
+        self._close = False
+        self.channel = ctx.channel
+        self.followup = self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.flush()
+
+    async def send(self, content: Optional[str] = None, *, embed: Optional[discord.Embed] = None,
+                   view: Optional[discord.ui.View] = None, **kwargs):
+        if view is not None or kwargs:
+            # L'appelant a besoin du message envoyé : vider le tampon puis envoyer tout de suite
+            await self.flush()
+            await self._dispatcher.throttle(self.channel.id)
+            return await self._ctx.followup.send(content, embed=embed, view=view, **kwargs)
+
+        if content:
+            self._contents.append(content)
+        if embed is not None:
+            self._embeds.append(embed)
+        return None
+
+    def show_board(self, session, embed: discord.Embed, attach_view: bool = False):
+        """Afficher cet état du combat sur son tableau, avec les messages de l'action"""
+        self._session = session
+        self._board = embed
+        self._attach_view = self._attach_view or attach_view
+
+    def close_board(self, session):
+        """Retirer les boutons du tableau ; les messages de l'action y remplacent l'état du combat"""
+        self._session = session
+        self._board = None
+        self._close = True
+
+    async def flush(self):
+        contents, embeds = self._contents, self._embeds
+        self._contents, self._embeds = [], []
+        session, self._session = self._session, None
+        if session is not None:
+            await self._dispatcher.update_board(self._ctx, session, contents, embeds,
+                                                self._board, self._attach_view, self._close)
+            return
+        if not contents and not embeds:
+            return
+
+        messages = pack_messages(contents, embeds)
+        self._dispatcher.coalesced += len(contents) + len(embeds) - len(messages)
+        for content, batch in messages:
+            await self._dispatcher.throttle(self.channel.id)
+            await self._ctx.followup.send(content, embeds=batch)
+
+# Noms d'affichage des joueurs
+class UserDirectory:
+    """Cache des noms d'affichage, indexé par identifiant, avec expiration après `ttl` secondes.
+
+    get_name ne bloque jamais : un nom absent du cache du bot est mis en file
+    et récupéré en arrière-plan par lots de requêtes REST, au rythme d'un
+    seau à jetons. resolve permet d'attendre ces récupérations un court instant.
+    """
+
+    def __init__(self, client: discord.Client, ttl: float = USER_CACHE_TTL, max_size: int = USER_CACHE_SIZE,
+                 batch_size: int = USER_FETCH_BATCH, rate: int = USER_FETCH_RATE):
+        self.client = client
+        self.ttl = ttl
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self._bucket = TokenBucket(rate, 1.0)
+        self._names: "OrderedDict[int, Tuple[str, float]]" = OrderedDict()  # id -> (nom, expiration)
+        self._pending: Dict[int, asyncio.Future] = {}  # Récupérations en file ou en cours
+        self._fetch_task = None
+        self.hits = 0
+        self.fetched = 0
+
+    def remember(self, user_id: int, name: str):
+        self._names[user_id] = (name, time.monotonic() + self.ttl)
+        self._names.move_to_end(user_id)
+        while len(self._names) > self.max_size:
+            self._names.popitem(last=False)
+
+    def get_name(self, user_id: int) -> Optional[str]:
+        """Nom en cache, ou None après avoir demandé sa récupération"""
+        cached = self._names.get(user_id)
+        if cached is not None and cached[1] > time.monotonic():
+            self.hits += 1
+            self._names.move_to_end(user_id)
+            return cached[0]
+
+        user = self.client.get_user(user_id)
+        if user is not None:
+            self.remember(user_id, user.display_name)
+            return user.display_name
+
+        self._enqueue(user_id)
+        return None
+
+    def _enqueue(self, user_id: int) -> asyncio.Future:
+        future = self._pending.get(user_id)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._pending[user_id] = loop.create_future()
+            if self._fetch_task is None or self._fetch_task.done():
+                self._start_fetch(loop)
+        return future
+
+    def _start_fetch(self, loop: asyncio.AbstractEventLoop):
+        self._fetch_task = loop.create_task(self._fetch_loop())
+        self._fetch_task.add_done_callback(self._fetch_done)
+
+    def _fetch_done(self, task: asyncio.Task):
+        """Relancer la récupération si sa tâche est morte avec des profils encore en file"""
+        if task is not self._fetch_task or not self._pending:
+            return
+        if task.cancelled():
+            # Arrêt du bot : débloquer ceux qui attendent encore un nom
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_result(None)
+            self._pending.clear()
+            return
+        if task.exception() is not None:
+            print(f"❌ Récupération des profils interrompue: {task.exception()!r}")
+        self._start_fetch(task.get_loop())
+
+    async def resolve(self, user_ids, timeout: float = 1.0) -> Dict[int, str]:
+        """Noms des joueurs demandés, en attendant au plus `timeout` secondes les profils manquants"""
+        names = {user_id: self.get_name(user_id) for user_id in user_ids}
+        waiting = [self._pending[user_id] for user_id, name in names.items() if name is None]
+        if waiting:
+            await asyncio.wait(waiting, timeout=timeout)
+            for user_id, name in names.items():
+                if name is None:
+                    cached = self._names.get(user_id)
+                    names[user_id] = cached[0] if cached is not None else None
+        return names
+
+    async def _fetch_one(self, user_id: int):
+        name = None
+        try:
+            await self._bucket.acquire()
+            name = (await self.client.fetch_user(user_id)).display_name
+        except discord.NotFound:
+            name = UNKNOWN_USER  # Compte supprimé : inutile de redemander avant l'expiration
+        except discord.HTTPException:
+            pass
+        except Exception as e:
+            # Délai dépassé, erreur réseau... : le nom sera redemandé au prochain get_name
+            print(f"❌ Erreur lors de la récupération du profil {user_id}: {e!r}")
+        finally:
+            # Toujours débloquer l'attente, même si la tâche est annulée
+            if name is not None:
+                self.fetched += 1
+                self.remember(user_id, name)
+            future = self._pending.pop(user_id, None)
+            if future is not None and not future.done():
+                future.set_result(name)
+
+    async def _fetch_loop(self):
+        while self._pending:
+            batch = list(self._pending)[:self.batch_size]
+            await asyncio.gather(*(self._fetch_one(user_id) for user_id in batch))
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            "cached": len(self._names),
+            "pending": len(self._pending),
+            "hits": self.hits,
+            "fetched": self.fetched,
+        }
+
+# Registre des combats en mémoire
+class SessionRegistry:
+    """Combats en cours, indexés par identifiant, par canal et par joueur.
+
+    Un canal peut accueillir plusieurs duels, mais un joueur ne participe
+    qu'à un seul à la fois : toute interaction retrouve son combat par
+    l'identifiant de son auteur.
+
+    Les combats sont abandonnés après `ttl` secondes d'inactivité. Une seule
+    tâche de fond dépile un tas d'échéances. Une session active garde son
+    entrée : à l'échéance, elle est simplement replacée à last_activity + ttl
+    au lieu d'être expirée.
+    """
+
+    def __init__(self, ttl: float = SESSION_TTL, max_sessions: int = MAX_SESSIONS,
+                 first_id: int = 1, id_step: int = 1):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions: Dict[int, CombatSession] = {}
+        self._by_channel: Dict[int, Dict[int, CombatSession]] = {}
+        self._by_player: Dict[int, CombatSession] = {}
+        # Plusieurs registres peuvent partager le journal : chacun tire ses identifiants
+        # dans sa propre suite first_id, first_id + id_step, ...
+        self._next_id = first_id
+        self.id_step = id_step
+        self._deadlines: List[Tuple[float, int, CombatSession]] = []  # (échéance, ordre, session)
+        self._counter = 0
+        self.expired = 0
+        self.completed = 0
+        # Appelée avec la session expirée pour nettoyer son interface
+        self.on_expire = None
+        self._sweep_task = None
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, session_id: int) -> Optional[CombatSession]:
+        return self._sessions.get(session_id)
+
+    def get_for_player(self, user_id: int) -> Optional[CombatSession]:
+        return self._by_player.get(user_id)
+
+    def in_channel(self, channel_id: int) -> List[CombatSession]:
+        return list(self._by_channel.get(channel_id, {}).values())
+
+    def is_full(self) -> bool:
+        return len(self._sessions) >= self.max_sessions
+
+    def is_registered(self, session: CombatSession) -> bool:
+        return self._sessions.get(session.session_id) is session
+
+    def _schedule(self, session: CombatSession):
+        self._counter += 1
+        heapq.heappush(self._deadlines, (session.last_activity + self.ttl, self._counter, session))
+
+    def add(self, session: CombatSession) -> bool:
+        """Enregistrer un combat ; refusé si la limite est atteinte ou si un joueur est déjà en duel"""
+        players = (session.player1_id, session.player2_id)
+        if self.is_full() or any(player_id in self._by_player for player_id in players):
+            return False
+        if session.session_id is None or session.session_id in self._sessions:
+            session.session_id = self._next_id
+        self.reserve_ids(session.session_id)
+
+        session.touch()
+        self._sessions[session.session_id] = session
+        self._by_channel.setdefault(session.channel_id, {})[session.session_id] = session
+        for player_id in players:
+            self._by_player[player_id] = session
+        self._schedule(session)
+        return True
+
+    def reserve_ids(self, last_id: int):
+        """Ne plus attribuer d'identifiant inférieur ou égal à `last_id` (en gardant le pas du processus)"""
+        if last_id >= self._next_id:
+            self._next_id += ((last_id - self._next_id) // self.id_step + 1) * self.id_step
+
+    def _remove(self, session: CombatSession) -> bool:
+        if not self.is_registered(session):
+            return False
+        del self._sessions[session.session_id]
+        channel_sessions = self._by_channel[session.channel_id]
+        del channel_sessions[session.session_id]
+        if not channel_sessions:
+            del self._by_channel[session.channel_id]
+        for player_id in (session.player1_id, session.player2_id):
+            del self._by_player[player_id]
+        return True
+
+    def complete(self, session: CombatSession) -> bool:
+        """Retirer un combat terminé normalement"""
+        if not self._remove(session):
+            return False
+        self.completed += 1
+        return True
+
+    async def expire(self, session: CombatSession) -> bool:
+        """Retirer un combat abandonné et nettoyer son interface"""
+        if not self._remove(session):
+            return False
+        self.expired += 1
+        if self.on_expire is not None:
+            try:
+                await self.on_expire(session)
+            except Exception as e:
+                print(f"❌ Erreur lors de l'expiration d'un combat: {e}")
+        return True
+
+    def pop_expired(self, now: float) -> List[CombatSession]:
+        """Dépiler les échéances passées et renvoyer les sessions réellement inactives"""
+        expired = []
+        while self._deadlines and self._deadlines[0][0] <= now:
+            _, _, session = heapq.heappop(self._deadlines)
+            if not self.is_registered(session):
+                continue  # Combat déjà terminé
+            if session.last_activity + self.ttl > now:
+                self._schedule(session)
+            else:
+                expired.append(session)
+        return expired
+
+    async def _sweep_loop(self):
+        while True:
+            # Une session ajoutée plus tard a une échéance postérieure à celles du tas
+            delay = self.ttl
+            if self._deadlines:
+                delay = min(delay, self._deadlines[0][0] - time.monotonic())
+            await asyncio.sleep(max(0.0, delay))
+            for session in self.pop_expired(time.monotonic()):
+                await self.expire(session)
+
+    def start(self):
+        if self._sweep_task is None or self._sweep_task.done():
+            self._sweep_task = asyncio.get_running_loop().create_task(self._sweep_loop())
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            "live": len(self._sessions),
+            "channels": len(self._by_channel),
+            "expired": self.expired,
+            "completed": self.completed,
+        }
+
+# Réponses attendues des joueurs
+class PromptDispatcher:
+    """Questions en attente d'une réponse, indexées par clé.
+
+    Une réponse par message est attendue sous la clé (channel_id, author_id) :
+    chaque message reçu est rapproché de sa question par une seule recherche
+    dans un dictionnaire, quel que soit le nombre de questions en attente.
+    Les délais de toutes les questions sont gérés par une unique tâche qui
+    dépile un tas d'échéances.
+    """
+
+    def __init__(self):
+        self._pending: Dict[tuple, asyncio.Future] = {}
+        self._deadlines: List[Tuple[float, int, tuple, asyncio.Future]] = []  # (échéance, ordre, clé, future)
+        self._counter = 0
+        self._wakeup = None
+        self._timeout_task = None
+        self.timeouts = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def is_waiting(self, key: tuple) -> bool:
+        return key in self._pending
+
+    async def wait(self, key: tuple, timeout: float = PROMPT_TIMEOUT):
+        """Attendre la réponse associée à `key` ; lève asyncio.TimeoutError après `timeout` secondes"""
+        previous = self._pending.get(key)
+        if previous is not None and not previous.done():
+            previous.set_exception(asyncio.TimeoutError())  # Remplacée par la nouvelle question
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending[key] = future
+
+        deadline = time.monotonic() + timeout
+        self._counter += 1
+        heapq.heappush(self._deadlines, (deadline, self._counter, key, future))
+        if self._timeout_task is None or self._timeout_task.done():
+            self._wakeup = asyncio.Event()
+            self._timeout_task = loop.create_task(self._timeout_loop())
+        elif self._deadlines[0][3] is future:
+            self._wakeup.set()  # Nouvelle échéance la plus proche
+
+        try:
+            return await future
+        finally:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+
+    def resolve(self, key: tuple, value) -> bool:
+        """Transmettre une réponse ; renvoie False si rien ne l'attendait"""
+        future = self._pending.pop(key, None)
+        if future is None or future.done():
+            return False
+        future.set_result(value)
+        return True
+
+    def expire(self, now: float):
+        while self._deadlines and self._deadlines[0][0] <= now:
+            _, _, key, future = heapq.heappop(self._deadlines)
+            if not future.done():
+                self.timeouts += 1
+                future.set_exception(asyncio.TimeoutError())
+            if self._pending.get(key) is future:
+                del self._pending[key]
+
+    async def _timeout_loop(self):
+        while True:
+            self._wakeup.clear()
+            delay = self._deadlines[0][0] - time.monotonic() if self._deadlines else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            self.expire(time.monotonic())
+
+    async def on_message(self, message: discord.Message):
+        if message.author.bot:
+            return
+        self.resolve((message.channel.id, message.author.id), message.content)
+
+# Journal des combats en cours
+class CombatJournal:
+    """Instantanés append-only des combats, rejoués au démarrage du bot"""
+
+    def __init__(self, database: AsyncDatabase):
+        self.database = database
+        self._restored = False
+        # Levé une fois les combats journalisés réinscrits : les commandes l'attendent
+        # pour qu'un nouveau duel ne prenne pas l'identifiant d'un combat à reprendre
+        self.ready = asyncio.Event()
+
+    async def record(self, session: CombatSession):
+        state = json.dumps(session.to_snapshot(), separators=(",", ":"))
+        await self.database.append_combat_snapshot(session.session_id, session.channel_id, session.turn_count, state)
+
+    async def clear(self, session_id: int):
+        await self.database.delete_combat_snapshots(session_id)
+
+    async def restore(self, registry: SessionRegistry, client: discord.Client, directory: UserDirectory,
+                      owns=None):
+        """Reprendre les combats interrompus et republier leur interface.
+
+        `owns(channel_id)` limite la reprise aux canaux gérés par ce processus.
+        Les combats sont réinscrits (et `ready` levé) avant toute requête à Discord.
+        """
+        if self._restored:
+            return
+        self._restored = True
+
+        try:
+            sessions = await self._register(registry, directory, owns)
+        finally:
+            self.ready.set()
+
+        for session in sessions:
+            channel = client.get_channel(session.channel_id)
+            if channel is None:
+                try:
+                    channel = await client.fetch_channel(session.channel_id)
+                except discord.HTTPException:
+                    registry.complete(session)
+                    await self.clear(session.session_id)
+                    continue
+
+            ctx = ChannelContext(channel)
+            await ctx.followup.send("♻️ Le bot a redémarré : le combat reprend là où il s'était arrêté!")
+            await show_combat_status(ctx, session)
+
+    async def _register(self, registry: SessionRegistry, directory: UserDirectory, owns) -> List[CombatSession]:
+        rows = await self.database.get_latest_combat_snapshots()
+        if rows:
+            # Tous les identifiants journalisés, y compris ceux des autres processus
+            registry.reserve_ids(max(session_id for session_id, _, _ in rows))
+
+        sessions = []
+        for session_id, channel_id, state in rows:
+            if registry.get(session_id) is not None or (owns is not None and not owns(channel_id)):
+                continue
+
+            data = json.loads(state)
+            session = CombatSession.from_snapshot(data)
+            session.session_id = session_id
+            if "names" not in data:
+                # Instantané antérieur à la capture des noms
+                names = await directory.resolve((session.player1_id, session.player2_id))
+                session.player1_name = names[session.player1_id] or UNKNOWN_USER
+                session.player2_name = names[session.player2_id] or UNKNOWN_USER
+            if not registry.add(session):
+                await self.clear(session_id)
+                continue
+            sessions.append(session)
+        return sessions
+
+# Démarrage rapide : synchronisation des commandes et données chaudes
+def command_signature(application_commands, application_id: Optional[int] = None) -> str:
+    """Empreinte des commandes slash : elle change avec un nom, une description, une option ou une permission"""
+    payload = sorted(([cmd.guild_ids, cmd.to_dict()] for cmd in application_commands),
+                     key=lambda item: (item[1]["name"], str(item[0])))
+    raw = json.dumps([application_id, payload], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+async def sync_commands_if_changed(client: discord.Bot, database: AsyncDatabase,
+                                   force: bool = FORCE_COMMAND_SYNC) -> bool:
+    """Envoyer les commandes slash à Discord seulement si leur empreinte a changé.
+
+    Sinon les identifiants de la dernière synchronisation sont réattribués aux
+    commandes, qui sont aiguillées comme après sync_commands. Renvoie True si
+    les commandes ont été synchronisées.
+    """
+    pending = client.pending_application_commands
+    signature = command_signature(pending, client.user.id if client.user else None)
+    stored = await database.get_state("commands")
+    state = json.loads(stored) if stored else {}
+    ids = state.get("ids", {})
+
+    if not force and state.get("signature") == signature and all(cmd.name in ids for cmd in pending):
+        for cmd in pending:
+            cmd.id = ids[cmd.name]
+            client._application_commands[cmd.id] = cmd
+        return False
+
+    await client.sync_commands()
+    ids = {cmd.name: cmd.id for cmd in pending if cmd.id is not None}
+    await database.set_state("commands", json.dumps({"signature": signature, "ids": ids}))
+    return True
+
+def write_warm_snapshot(leaderboard: LeaderboardService, cache: CharacterCache, path: str = WARM_SNAPSHOT_PATH,
+                        limit: int = WARM_SNAPSHOT_CHARACTERS) -> bool:
+    """Écrire à l'arrêt les classements et les personnages récents, une fois le cache écrit en base"""
+    if not path or cache.dirty_count:
+        # Des modifications perdues : l'instantané serait en avance sur la base
+        return False
+
+    data = {
+        "version": WARM_SNAPSHOT_VERSION,
+        "leaderboard": leaderboard.to_snapshot(),
+        "characters": [character.to_snapshot() for character in cache.recent(limit)],
+    }
+    temporary = path + ".tmp"
+    with gzip.open(temporary, "wt", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(temporary, path)
+    return True
+
+def read_warm_snapshot(path: str = WARM_SNAPSHOT_PATH) -> Optional[dict]:
+    """Lire puis supprimer l'instantané : il ne vaut que pour le lancement qui suit l'arrêt qui l'a écrit"""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Instantané de démarrage illisible, chargement depuis la base: {e}")
+        data = None
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    if not isinstance(data, dict) or data.get("version") != WARM_SNAPSHOT_VERSION:
+        return None
+    return data
+
+async def load_warm_snapshot(leaderboard: LeaderboardService, cache: CharacterCache,
+                             path: str = WARM_SNAPSHOT_PATH) -> bool:
+    """Précharger les classements et les personnages récents depuis l'instantané de l'arrêt précédent"""
+    data = await asyncio.get_running_loop().run_in_executor(None, read_warm_snapshot, path)
+    if data is None:
+        return False
+    try:
+        characters = [Character.from_snapshot(character) for character in data["characters"]]
+        if data["leaderboard"] is not None:
+            leaderboard.restore(data["leaderboard"])
+    except (KeyError, TypeError, ValueError) as e:
+        print(f"⚠️ Instantané de démarrage invalide, chargement depuis la base: {e}")
+        return False
+    cache.warm(characters)
+    return True
+
 # Instances globales
-db = Database()
+db = AsyncDatabase()
+character_names = CharacterNameIndex(db)
+character_cache = CharacterCache(db, names=character_names)
+leaderboard_service = LeaderboardService(db)
 combat_system = CombatSystem()
+session_registry = SessionRegistry()
+combat_journal = CombatJournal(db)
+outbound = OutboundDispatcher()
+prompts = PromptDispatcher()
+user_directory = UserDirectory(bot)
+bot.add_listener(prompts.on_message, "on_message")
+
+metrics.gauge("rpg_sessions", "Combats en mémoire", "state", session_registry.metrics)
+metrics.gauge("rpg_outbound", "File d'envoi des messages par canal", "field", outbound.metrics)
+metrics.gauge("rpg_user_directory", "Cache des noms d'utilisateurs", "field", user_directory.metrics)
+metrics.gauge("rpg_character_cache", "Cache des personnages", "field", lambda: {
+    "entries": len(character_cache._entries),
+    "dirty": character_cache.dirty_count,
+})
+metrics.gauge("rpg_loop_blocks", "Blocages de la boucle asyncio par site d'appel", "site",
+              lambda: dict(watchdog.blocks))
+metrics.gauge("rpg_startup_seconds", "Durée des étapes du démarrage depuis le lancement", "phase",
+              lambda: startup.phases)
+metrics.gauge("rpg_prompts", "Questions en attente d'une réponse", "field", lambda: {
+    "waiting": len(prompts),
+    "timeouts": prompts.timeouts,
+})
+
+@bot.before_invoke
+async def start_command_timer(ctx):
+    watchdog.label(f"/{ctx.command.qualified_name}")
+    metrics.command_started(ctx.interaction.id)
+
+@bot.after_invoke
+async def stop_command_timer(ctx):
+    metrics.command_finished(ctx.interaction.id, ctx.command.qualified_name)
+    startup.mark("premiere_reponse", f" (/{ctx.command.qualified_name})")
+
+async def expire_combat(session: CombatSession):
+    """Clore un combat abandonné : message dans le canal, boutons retirés, journal effacé"""
+    async with session.lock:
+        session.finished = True
+
+    channel = bot.get_channel(session.channel_id)
+    if channel is not None:
+        # Le message d'annulation remplace le tableau, en une seule modification
+        try:
+            async with outbound.coalesce(ChannelContext(channel)) as ctx:
+                await ctx.followup.send(f"⌛ Le combat entre <@{session.player1_id}> et <@{session.player2_id}> "
+                                        "est annulé faute d'activité.")
+                await close_combat_board(ctx, session)
+        except discord.HTTPException:
+            pass
+    elif session.view is not None:
+        session.view.stop()
+        session.view = None
+
+    await combat_journal.clear(session.session_id)
+
+session_registry.on_expire = expire_combat
 
 # ========== COMMANDES SLASH ==========
 
+@bot.event
+async def on_connect():
+    # Remplace la synchronisation systématique des commandes de discord.Bot.on_connect
+    startup.mark("connexion")
+    if await load_warm_snapshot(leaderboard_service, character_cache):
+        startup.mark("donnees_chaudes", f" ({len(character_cache._entries)} personnages préchargés)")
+    if await sync_commands_if_changed(bot, db):
+        startup.mark("commandes", " (synchronisées)")
+    else:
+        startup.mark("commandes", " (inchangées, synchronisation évitée)")
+
 @bot.event
 async def on_ready():
+    startup.mark("pret")
     print(f'{bot.user} est connecté et prêt!')
     print(f'Bot actif sur {len(bot.guilds)} serveur(s)')
+    character_cache.start()
+    session_registry.start()
+    try:
+        await combat_journal.restore(session_registry, bot, user_directory)
+    finally:
+        # Même en cas d'échec de la reprise, les commandes de combat ne doivent pas rester bloquées
+        combat_journal.ready.set()
+    await metrics.start()
+    watchdog.start()
+    await leaderboard_service.load()
     await bot.change_presence(activity=discord.Game(name="RPG Discord | /aide"))
 
 @bot.slash_command(name="creer_personnage", description="Créer un nouveau personnage")
 async def create_character(ctx, nom_complet: str):
     """Créer un nouveau personnage"""
 
-    existing_char = db.get_character(nom_complet, ctx.author.id)
+    if (prompts.is_waiting((ctx.channel.id, ctx.author.id))
+            or prompts.is_waiting((ctx.channel.id, ctx.author.id, "categorie"))):
+        await ctx.respond("Vous avez déjà une création de personnage en cours dans ce canal!")
+        return
+
+    existing_char = await character_cache.get_character(nom_complet, ctx.author.id)
     if existing_char:
         await ctx.respond(f"Vous avez déjà un personnage nommé **{nom_complet}**!")
         return
@@ -507,81 +2599,137 @@ async def create_character(ctx, nom_complet: str):
 
     await ctx.respond(embed=embed)
 
-    # Processus de création des compétences
+    # Processus de création des compétences : rien n'est enregistré avant la dernière étape
     await ctx.followup.send("Vous pouvez maintenant créer **2 compétences** pour votre personnage.")
 
-    for i in range(2):
-        await ctx.followup.send(f"**Compétence {i+1}/2**")
+    message_key = (ctx.channel.id, ctx.author.id)
+    category_key = (ctx.channel.id, ctx.author.id, "categorie")
 
-        # Demander le nom de la compétence
-        await ctx.followup.send("Entrez le nom de la compétence:")
-        try:
-            name_msg = await bot.wait_for('message', 
-                                        check=lambda m: m.author == ctx.author and m.channel == ctx.channel,
-                                        timeout=60.0)
-            skill_name = name_msg.content
-        except asyncio.TimeoutError:
-            await ctx.followup.send("Temps écoulé. Création annulée.")
-            return
+    class CategorySelect(discord.ui.Select):
+        def __init__(self):
+            options = [
+                discord.SelectOption(label="Attaque", description="Dégâts x1,5, coût 10%, cooldown 1 tour", value="1"),
+                discord.SelectOption(label="Bonus", description="Prochaine attaque +30%, coût 15%, cooldown 2 tours", value="2"),
+                discord.SelectOption(label="Malus", description="Prochaine attaque adverse -30%, coût 15%, cooldown 2 tours", value="3"),
+                discord.SelectOption(label="Restreinte", description="Fait sauter un tour, dégâts x0.8, coût 20%, cooldown 3 tours", value="4")
+            ]
+            super().__init__(placeholder="Choisissez une catégorie...", options=options)
 
-        # Demander l'effet de la compétence
-        await ctx.followup.send("Entrez l'effet de la compétence:")
-        try:
-            effect_msg = await bot.wait_for('message',
-                                          check=lambda m: m.author == ctx.author and m.channel == ctx.channel,
-                                          timeout=60.0)
-            skill_effect = effect_msg.content
-        except asyncio.TimeoutError:
-            await ctx.followup.send("Temps écoulé. Création annulée.")
-            return
+        async def callback(self, interaction: discord.Interaction):
+            if interaction.user.id != ctx.author.id:
+                await interaction.response.send_message("Ce n'est pas votre personnage!", ephemeral=True)
+                return
 
-        # Demander la catégorie avec Select Menu
-        class CategorySelect(discord.ui.Select):
-            def __init__(self):
-                options = [
-                    discord.SelectOption(label="Attaque", description="Dégâts x1,5, coût 10%, cooldown 1 tour", value="1"),
-                    discord.SelectOption(label="Bonus", description="Prochaine attaque +30%, coût 15%, cooldown 2 tours", value="2"),
-                    discord.SelectOption(label="Malus", description="Prochaine attaque adverse -30%, coût 15%, cooldown 2 tours", value="3"),
-                    discord.SelectOption(label="Restreinte", description="Fait sauter un tour, dégâts x0.8, coût 20%, cooldown 3 tours", value="4")
-                ]
-                super().__init__(placeholder="Choisissez une catégorie...", options=options)
-
-            async def callback(self, interaction: discord.Interaction):
-                category_map = {
-                    '1': SkillCategory.ATTAQUE,
-                    '2': SkillCategory.BONUS,
-                    '3': SkillCategory.MALUS,
-                    '4': SkillCategory.RESTREINTE
-                }
-
-                skill_category = category_map[self.values[0]]
-                skill = Skill(name=skill_name, effect=skill_effect, category=skill_category)
-                character.skills.append(skill)
-
-                await interaction.response.send_message(f"✅ Compétence **{skill_name}** créée!")
-
-                if len(character.skills) == 2:
-                    char_id = db.save_character(character)
-                    if char_id:
-                        await ctx.followup.send(f"🎉 Personnage **{nom_complet}** créé avec succès!")
-                    else:
-                        await ctx.followup.send("❌ Erreur lors de la création du personnage.")
-
-        class CategoryView(discord.ui.View):
-            def __init__(self):
-                super().__init__(timeout=60)
-                self.add_item(CategorySelect())
-
-            async def on_timeout(self):
-                await ctx.followup.send("Temps écoulé. Création annulée.")
-
-        await ctx.followup.send("Choisissez une catégorie:", view=CategoryView())
+            category_map = {
+                '1': SkillCategory.ATTAQUE,
+                '2': SkillCategory.BONUS,
+                '3': SkillCategory.MALUS,
+                '4': SkillCategory.RESTREINTE
+            }
+
+            if not prompts.resolve(category_key, category_map[self.values[0]]):
+                await interaction.response.send_message("Cette sélection a expiré.", ephemeral=True)
+                return
+
+            self.view.stop()
+            await interaction.response.send_message(f"✅ Catégorie **{category_map[self.values[0]].value}** choisie!")
+
+    class CategoryView(TimedView):
+        def __init__(self):
+            # Le délai est géré par le dispatcher de questions
+            super().__init__(timeout=None)
+            self.add_item(CategorySelect())
+
+    skills = []
+    try:
+        for i in range(2):
+            await ctx.followup.send(f"**Compétence {i+1}/2**")
+
+            # Demander le nom de la compétence
+            await ctx.followup.send("Entrez le nom de la compétence:")
+            skill_name = await prompts.wait(message_key)
+
+            # Demander l'effet de la compétence
+            await ctx.followup.send("Entrez l'effet de la compétence:")
+            skill_effect = await prompts.wait(message_key)
+
+            # Demander la catégorie avec Select Menu
+            view = CategoryView()
+            await ctx.followup.send("Choisissez une catégorie:", view=view)
+            try:
+                skill_category = await prompts.wait(category_key)
+            finally:
+                view.stop()
+
+            skills.append(Skill(name=skill_name, effect=skill_effect, category=skill_category))
+            await ctx.followup.send(f"✅ Compétence **{skill_name}** créée!")
+    except asyncio.TimeoutError:
+        await ctx.followup.send("Temps écoulé. Création annulée.")
+        return
+
+    character.skills = skills
+    char_id = await character_cache.save_character(character)
+    if char_id:
+        leaderboard_service.update(character)
+        await ctx.followup.send(f"🎉 Personnage **{nom_complet}** créé avec succès!")
+    else:
+        await ctx.followup.send("❌ Erreur lors de la création du personnage.")
+
+# Autocomplétion : Discord rejette toute la réponse si un libellé ou une valeur dépasse 100 caractères
+def choice_reference(name: str) -> str:
+    """Valeur courte et stable d'un nom trop long : début du nom et empreinte du nom complet"""
+    digest = hashlib.sha1(name.encode()).hexdigest()[:12]
+    return f"{name[:AUTOCOMPLETE_TEXT_MAX - 14]}…#{digest}"
+
+def is_choice_reference(value: str) -> bool:
+    return len(value) == AUTOCOMPLETE_TEXT_MAX and value[-14:-12] == "…#"
+
+def resolve_choice(value: str, names) -> str:
+    """Nom complet parmi `names` correspondant à une référence, sinon la valeur telle quelle"""
+    if is_choice_reference(value):
+        prefix = value[:-14]
+        for name in names:
+            if name.startswith(prefix) and choice_reference(name) == value:
+                return name
+    return value
+
+def autocomplete_choice(label: str, value: str) -> discord.OptionChoice:
+    if len(label) > AUTOCOMPLETE_TEXT_MAX:
+        label = label[:AUTOCOMPLETE_TEXT_MAX - 1] + "…"
+    if len(value) > AUTOCOMPLETE_TEXT_MAX:
+        value = choice_reference(value)
+    return discord.OptionChoice(label, value)
+
+async def character_name_autocomplete(ctx: discord.AutocompleteContext) -> List[discord.OptionChoice]:
+    """Personnages du joueur commençant par la saisie, servis par l'index en mémoire"""
+    names = await character_names.complete(ctx.interaction.user.id, ctx.value or "")
+    return [autocomplete_choice(name, name) for name in names]
+
+async def skill_name_autocomplete(ctx: discord.AutocompleteContext) -> List[discord.OptionChoice]:
+    """Compétences du personnage en combat commençant par la saisie, avec leur recharge"""
+    session = session_registry.get_for_player(ctx.interaction.user.id)
+    if session is None or session.fighters is None:
+        return []
+
+    fighter = session.get_fighter(ctx.interaction.user.id)
+    prefix = (ctx.value or "").casefold()
+    choices = []
+    for key, index in fighter.skill_index.items():
+        if key.startswith(prefix):
+            name, cooldown = fighter.skills[index].name, fighter.skill_cooldowns[index]
+            label = f"{name} (recharge : {cooldown} tours)" if cooldown else name
+            choices.append(autocomplete_choice(label, name))
+    return choices[:AUTOCOMPLETE_LIMIT]
 
 @bot.slash_command(name="stats", description="Afficher les statistiques d'un personnage")
-async def show_stats(ctx, nom_personnage: str):
+async def show_stats(ctx, nom_personnage: discord.Option(str, autocomplete=character_name_autocomplete)):
     """Afficher les statistiques d'un personnage"""
 
-    character = db.get_character(nom_personnage, ctx.author.id)
+    nom_personnage = await character_names.resolve(ctx.author.id, nom_personnage)
+    # Un nom absent de l'index est refusé sans interroger la base
+    character = None
+    if character_names.may_exist(ctx.author.id, nom_personnage):
+        character = await character_cache.get_character(nom_personnage, ctx.author.id)
     if not character:
         await ctx.respond(f"Vous n'avez pas de personnage nommé **{nom_personnage}**.")
         return
@@ -614,7 +2762,7 @@ async def show_stats(ctx, nom_personnage: str):
 async def my_characters(ctx):
     """Lister tous vos personnages"""
 
-    characters = db.get_all_characters(ctx.author.id)
+    characters = await character_cache.get_all_characters(ctx.author.id)
     if not characters:
         await ctx.respond("Vous n'avez aucun personnage. Utilisez `/creer_personnage` pour en créer un!")
         return
@@ -637,6 +2785,10 @@ async def my_characters(ctx):
 async def challenge_player(ctx, opponent: discord.Member):
     """Défier un autre joueur en combat"""
 
+    # Pas de combat touché avant la réinscription de ceux du journal (les boutons
+    # n'existent qu'une fois ce verrou levé)
+    await combat_journal.ready.wait()
+
     if opponent == ctx.author:
         await ctx.respond("Vous ne pouvez pas vous défier vous-même!")
         return
@@ -645,19 +2797,27 @@ async def challenge_player(ctx, opponent: discord.Member):
         await ctx.respond("Vous ne pouvez pas défier un bot!")
         return
 
-    player1_chars = db.get_all_characters(ctx.author.id)
-    player2_chars = db.get_all_characters(opponent.id)
-
-    if not player1_chars:
+    if not await db.has_any_character(ctx.author.id):
         await ctx.respond("Vous n'avez aucun personnage! Créez-en un avec `/creer_personnage`.")
         return
 
-    if not player2_chars:
+    if not await db.has_any_character(opponent.id):
         await ctx.respond(f"{opponent.display_name} n'a aucun personnage!")
         return
 
-    session = CombatSession(ctx.author.id, opponent.id, ctx.channel.id)
-    combat_system.active_combats[ctx.channel.id] = session
+    if session_registry.get_for_player(ctx.author.id) is not None:
+        await ctx.respond("Vous participez déjà à un combat!")
+        return
+
+    if session_registry.get_for_player(opponent.id) is not None:
+        await ctx.respond(f"{opponent.display_name} participe déjà à un combat!")
+        return
+
+    session = CombatSession(ctx.author.id, opponent.id, ctx.channel.id,
+                            ctx.author.display_name, opponent.display_name)
+    if not session_registry.add(session):
+        await ctx.respond("⏳ Trop de combats sont en cours, réessayez dans quelques minutes!")
+        return
 
     challenge_embed = discord.Embed(
         title="⚔️ Défi de Combat!",
@@ -673,47 +2833,48 @@ async def challenge_player(ctx, opponent: discord.Member):
     await ctx.respond(embed=challenge_embed)
 
 @bot.slash_command(name="choisir_personnage", description="Choisir un personnage pour le combat")
-async def choose_character(ctx, nom_personnage: str):
+async def choose_character(ctx, nom_personnage: discord.Option(str, autocomplete=character_name_autocomplete)):
     """Choisir un personnage pour le combat"""
 
-    if ctx.channel.id not in combat_system.active_combats:
-        await ctx.respond("Aucun combat en cours dans ce canal!")
+    await combat_journal.ready.wait()
+    session = session_registry.get_for_player(ctx.author.id)
+    if session is None:
+        await ctx.respond("Vous ne participez à aucun combat!")
         return
 
-    session = combat_system.active_combats[ctx.channel.id]
-
-    if ctx.author.id not in [session.player1_id, session.player2_id]:
-        await ctx.respond("Vous ne participez pas à ce combat!")
+    if session.channel_id != ctx.channel.id:
+        await ctx.respond(f"Votre combat se déroule dans <#{session.channel_id}>!")
         return
 
-    character = db.get_character(nom_personnage, ctx.author.id)
+    session.touch()
+    nom_personnage = await character_names.resolve(ctx.author.id, nom_personnage)
+    character = None
+    if character_names.may_exist(ctx.author.id, nom_personnage):
+        character = await character_cache.get_character(nom_personnage, ctx.author.id)
     if not character:
         await ctx.respond(f"Vous n'avez pas de personnage nommé **{nom_personnage}**.")
         return
 
-    # Réinitialiser les états de combat
-    character.defending = False
-    character.defense_cooldown = 0
-    character.bonus_next_attack = 1.0
-    character.malus_next_received = 1.0
-    character.bloodlust_turns = 0
-    character.weakened_turns = 0
-    character.skip_next_turn = False
-    character.was_in_bloodlust = False
-    character.hp = character.max_hp
-    character.power_gauge = 100.0
-
-    for skill in character.skills:
-        skill.cooldown = 0
+    # Vérifié après la lecture : l'adversaire a pu compléter la paire pendant l'attente.
+    # Relancer prepare_combat remettrait à neuf les PV et la jauge d'un duel en cours.
+    if session.finished or session.state is not None:
+        await ctx.respond("Les personnages de ce combat sont déjà choisis!", ephemeral=True)
+        return
 
+    # Le duel ne modifie que son CombatState : le personnage du cache est partagé, pas copié
     if ctx.author.id == session.player1_id:
         session.player1_character = character
     else:
         session.player2_character = character
 
+    # Préparé avant tout await : seul le choix qui complète la paire lance la suite
+    ready = session.player1_character is not None and session.player2_character is not None
+    if ready:
+        session.prepare_combat()
+
     await ctx.respond(f"✅ **{nom_personnage}** sélectionné pour le combat!")
 
-    if session.player1_character and session.player2_character:
+    if ready:
         await start_objective_selection(ctx, session)
 
 async def start_objective_selection(ctx, session):
@@ -734,6 +2895,13 @@ async def start_objective_selection(ctx, session):
                 await interaction.response.send_message("Ce n'est pas votre sélection!", ephemeral=True)
                 return
 
+            current = session.player1_objective if self.user_id == session.player1_id else session.player2_objective
+            if session.finished or session.combat_started or current is not None:
+                # Menu resté affiché : l'objectif ne change plus une fois choisi
+                self.view.stop()
+                await interaction.response.send_message("Votre objectif est déjà choisi!", ephemeral=True)
+                return
+
             objective_map = {
                 '1': ObjectifVictoire.KO,
                 '2': ObjectifVictoire.VIDER_POUVOIR,
@@ -741,37 +2909,49 @@ async def start_objective_selection(ctx, session):
             }
 
             objective = objective_map[self.values[0]]
+            self.view.answered = True
+            self.view.stop()
+            session.touch()
 
             if interaction.user.id == session.player1_id:
                 session.player1_objective = objective
             else:
                 session.player2_objective = objective
+            # Décidé avant tout await : seul le choix qui complète la paire lance la suite
+            start_rps = session.both_players_ready()
 
             await interaction.response.send_message(f"✅ Objectif sélectionné: **{objective.value}**")
 
-            if session.both_players_ready():
-                await start_rock_paper_scissors(ctx, session)
+            if start_rps:
+                # Le choix qui complète la paire sert de contexte à la suite, pas la commande d'origine
+                await start_rock_paper_scissors(interaction, session)
 
-    class ObjectiveView(discord.ui.View):
+    class ObjectiveView(TimedView):
         def __init__(self, user_id):
             super().__init__(timeout=60)
+            self.answered = False
             self.add_item(ObjectiveSelect(user_id))
 
+        async def on_timeout(self):
+            # Un joueur qui ne répond pas abandonne le défi
+            if not self.answered and not session.combat_started:
+                await session_registry.expire(session)
+
     objectives_embed = discord.Embed(
         title="🎯 Choix des Objectifs de Victoire",
         description="Chaque joueur doit choisir son objectif",
         color=0x00ff7f
     )
 
-    player1 = bot.get_user(session.player1_id)
-    player2 = bot.get_user(session.player2_id)
-
-    await ctx.followup.send(f"{player1.mention}, choisissez votre objectif:", embed=objectives_embed, view=ObjectiveView(session.player1_id))
-    await ctx.followup.send(f"{player2.mention}, choisissez votre objectif:", embed=objectives_embed, view=ObjectiveView(session.player2_id))
+    await ctx.followup.send(f"<@{session.player1_id}>, choisissez votre objectif:", embed=objectives_embed, view=ObjectiveView(session.player1_id))
+    await ctx.followup.send(f"<@{session.player2_id}>, choisissez votre objectif:", embed=objectives_embed, view=ObjectiveView(session.player2_id))
 
 async def start_rock_paper_scissors(ctx, session):
     """Commencer le pierre-feuille-ciseaux pour déterminer l'ordre"""
 
+    session.rps_round += 1
+    rps_round = session.rps_round
+
     class RPSSelect(discord.ui.Select):
         def __init__(self, user_id):
             self.user_id = user_id
@@ -787,28 +2967,42 @@ async def start_rock_paper_scissors(ctx, session):
                 await interaction.response.send_message("Ce n'est pas votre tour!", ephemeral=True)
                 return
 
+            if (session.finished or session.combat_started or session.rps_round != rps_round
+                    or self.user_id in session.rps_results):
+                # Menu d'une manche passée ou déjà joué : il ne compte pas pour la manche en cours
+                self.view.stop()
+                await interaction.response.send_message("Ce choix n'est plus valable!", ephemeral=True)
+                return
+
             session.rps_results[interaction.user.id] = self.values[0]
+            self.view.answered = True
+            self.view.stop()
+            session.touch()
+            # Décidé avant tout await : seul le second choix de la manche la résout
+            resolve = len(session.rps_results) == 2
             await interaction.response.send_message("✅ Choix enregistré!", ephemeral=True)
 
-            if len(session.rps_results) == 2:
-                await resolve_rps(ctx, session)
+            if resolve:
+                await resolve_rps(interaction, session)
 
-    class RPSView(discord.ui.View):
+    class RPSView(TimedView):
         def __init__(self, user_id):
             super().__init__(timeout=60)
+            self.answered = False
             self.add_item(RPSSelect(user_id))
 
+        async def on_timeout(self):
+            if not self.answered and not session.combat_started:
+                await session_registry.expire(session)
+
     rps_embed = discord.Embed(
         title="✂️ Pierre-Feuille-Ciseaux",
         description="Choisissez pour déterminer l'ordre du combat",
         color=0xffff00
     )
 
-    player1 = bot.get_user(session.player1_id)
-    player2 = bot.get_user(session.player2_id)
-
-    await ctx.followup.send(f"{player1.mention}", embed=rps_embed, view=RPSView(session.player1_id))
-    await ctx.followup.send(f"{player2.mention}", embed=rps_embed, view=RPSView(session.player2_id))
+    await ctx.followup.send(f"<@{session.player1_id}>", embed=rps_embed, view=RPSView(session.player1_id))
+    await ctx.followup.send(f"<@{session.player2_id}>", embed=rps_embed, view=RPSView(session.player2_id))
 
 async def resolve_rps(ctx, session):
     """Résoudre le pierre-feuille-ciseaux"""
@@ -816,9 +3010,6 @@ async def resolve_rps(ctx, session):
     player1_choice = session.rps_results[session.player1_id]
     player2_choice = session.rps_results[session.player2_id]
 
-    player1 = bot.get_user(session.player1_id)
-    player2 = bot.get_user(session.player2_id)
-
     win_conditions = {
         ('pierre', 'ciseaux'): session.player1_id,
         ('feuille', 'pierre'): session.player1_id,
@@ -829,39 +3020,101 @@ async def resolve_rps(ctx, session):
     }
 
     result_embed = discord.Embed(title="✂️ Résultat du Pierre-Feuille-Ciseaux", color=0x00ff00)
-    result_embed.add_field(name=player1.display_name, value=player1_choice.capitalize(), inline=True)
+    result_embed.add_field(name=session.player1_name, value=player1_choice.capitalize(), inline=True)
     result_embed.add_field(name="VS", value="⚔️", inline=True)
-    result_embed.add_field(name=player2.display_name, value=player2_choice.capitalize(), inline=True)
+    result_embed.add_field(name=session.player2_name, value=player2_choice.capitalize(), inline=True)
 
     if (player1_choice, player2_choice) in win_conditions:
         winner_id = win_conditions[(player1_choice, player2_choice)]
         session.current_turn = winner_id
-        winner = bot.get_user(winner_id)
-        result_embed.add_field(name="🏆 Gagnant", value=f"{winner.display_name} commence!", inline=False)
-
-        await ctx.followup.send(embed=result_embed)
+        result_embed.add_field(name="🏆 Gagnant", value=f"{session.get_player_name(winner_id)} commence!", inline=False)
 
         session.combat_started = True
         session.turn_count = 1
-        await show_combat_status(ctx, session)
+        # Le résultat accompagne le premier affichage du tableau
+        async with outbound.coalesce(ctx) as buffered:
+            await buffered.followup.send(embed=result_embed)
+            await show_combat_status(buffered, session)
     else:
         result_embed.add_field(name="🤝 Égalité", value="Rejouez!", inline=False)
         session.rps_results.clear()
         await ctx.followup.send(embed=result_embed)
         await start_rock_paper_scissors(ctx, session)
 
-async def show_combat_status(ctx, session):
-    """Afficher le statut actuel du combat"""
+# Actions disponible via boutons
+class CombatView(TimedView):
+    """Boutons d'un combat : une seule vue par session, conservée jusqu'à la fin du duel.
+
+    Les custom_id sont fixes pour que la vue puisse être rattachée au message
+    du combat après un redémarrage. Les messages d'une action passent par
+    l'interaction du clic : le jeton de la commande d'origine expire au bout
+    de 15 minutes, bien avant la fin d'un long combat.
+    """
+
+    def __init__(self, session: CombatSession):
+        super().__init__(timeout=None)
+        self.session = session
+
+    async def _run(self, interaction: discord.Interaction, action, require_turn: bool):
+        """Appliquer l'action seule sur la session ; les clics en double ou périmés sont refusés"""
+        session = self.session
+        user_id = interaction.user.id
+
+        if not session.can_act(user_id, require_turn):
+            message = "Ce n'est pas votre tour!" if require_turn else "Vous ne participez pas à ce combat!"
+            await interaction.response.send_message(message, ephemeral=True)
+            return
 
-    char1 = session.player1_character
-    char2 = session.player2_character
-    player1 = bot.get_user(session.player1_id)
-    player2 = bot.get_user(session.player2_id)
-    current_player = bot.get_user(session.current_turn)
+        if user_id in session.pending_actions:
+            await interaction.response.send_message("⏳ Votre action précédente est encore en cours!", ephemeral=True)
+            return
+
+        session.pending_actions.add(user_id)
+        session.touch()
+        try:
+            # Le clic est acquitté tout de suite, avant toute attente de verrou ou de jeton d'envoi
+            await interaction.response.defer()
+            buffered = outbound.coalesce(interaction)
+            async with session.lock:
+                # L'état a pu changer pendant l'attente (double clic, /competence simultanée)
+                if not session.can_act(user_id, require_turn):
+                    await interaction.followup.send("Action ignorée : le combat a déjà avancé!", ephemeral=True)
+                    return
+                await action(buffered, session, interaction)
+            # Envoi hors du verrou : l'action suivante s'applique pendant l'attente du jeton du canal
+            await buffered.flush()
+        finally:
+            session.pending_actions.discard(user_id)
+
+    @discord.ui.button(label="Attaque", style=discord.ButtonStyle.red, emoji="⚔️", custom_id="rpg_combat:attaque")
+    async def attack_button(self, button: discord.ui.Button, interaction: discord.Interaction):
+        await self._run(interaction, lambda ctx, session, i: basic_attack_action(ctx, session, i.user.id), True)
+
+    @discord.ui.button(label="Défense", style=discord.ButtonStyle.gray, emoji="🛡️", custom_id="rpg_combat:defense")
+    async def defense_button(self, button: discord.ui.Button, interaction: discord.Interaction):
+        await self._run(interaction, lambda ctx, session, i: defense_action_handler(ctx, session, i.user.id), True)
+
+    @discord.ui.button(label="Bloodlust", style=discord.ButtonStyle.danger, emoji="🔥", custom_id="rpg_combat:bloodlust")
+    async def bloodlust_button(self, button: discord.ui.Button, interaction: discord.Interaction):
+        await self._run(interaction, lambda ctx, session, i: bloodlust_action(ctx, session, i.user.id), False)
+
+    @discord.ui.button(label="Forfait", style=discord.ButtonStyle.secondary, emoji="🏳️", custom_id="rpg_combat:forfait")
+    async def forfeit_button(self, button: discord.ui.Button, interaction: discord.Interaction):
+        await self._run(interaction, forfeit_action, False)
+
+async def forfeit_action(ctx, session, interaction: discord.Interaction):
+    winner_id = session.get_opponent_id(interaction.user.id)
+    await ctx.followup.send(f"🏳️ **{interaction.user.display_name}** abandonne le combat!")
+    await end_combat(ctx, session, winner_id)
+
+def build_combat_embed(session) -> discord.Embed:
+    """Embed du statut du combat, affiché sur le message des boutons"""
+
+    char1, char2 = session.fighters
 
     embed = discord.Embed(
         title=f"⚔️ Combat - Tour {session.turn_count}",
-        description=f"C'est au tour de **{current_player.display_name}**!",
+        description=f"C'est au tour de **{session.get_player_name(session.current_turn)}**!",
         color=0xff6b6b
     )
 
@@ -877,7 +3130,7 @@ async def show_combat_status(ctx, session):
         p1_status += f"\n⏳ Défense en recharge ({char1.defense_cooldown})"
 
     embed.add_field(
-        name=f"👤 {player1.display_name} - {char1.name}",
+        name=f"👤 {session.player1_name} - {char1.name}",
         value=p1_status,
         inline=True
     )
@@ -896,60 +3149,87 @@ async def show_combat_status(ctx, session):
         p2_status += f"\n⏳ Défense en recharge ({char2.defense_cooldown})"
 
     embed.add_field(
-        name=f"👤 {player2.display_name} - {char2.name}",
+        name=f"👤 {session.player2_name} - {char2.name}",
         value=p2_status,
         inline=True
     )
 
-    # Actions disponible via boutons
-    class CombatView(discord.ui.View):
-        def __init__(self):
-            super().__init__(timeout=300)
-
-        @discord.ui.button(label="Attaque", style=discord.ButtonStyle.red, emoji="⚔️")
-        async def attack_button(self, button: discord.ui.Button, interaction: discord.Interaction):
-            if interaction.user.id != session.current_turn:
-                await interaction.response.send_message("Ce n'est pas votre tour!", ephemeral=True)
-                return
-
-            await interaction.response.defer()
-            await basic_attack_action(ctx, session, interaction.user.id)
-
-        @discord.ui.button(label="Défense", style=discord.ButtonStyle.gray, emoji="🛡️")
-        async def defense_button(self, button: discord.ui.Button, interaction: discord.Interaction):
-            if interaction.user.id != session.current_turn:
-                await interaction.response.send_message("Ce n'est pas votre tour!", ephemeral=True)
-                return
-
-            await interaction.response.defer()
-            await defense_action_handler(ctx, session, interaction.user.id)
-
-        @discord.ui.button(label="Bloodlust", style=discord.ButtonStyle.danger, emoji="🔥")
-        async def bloodlust_button(self, button: discord.ui.Button, interaction: discord.Interaction):
-            if interaction.user.id not in [session.player1_id, session.player2_id]:
-                await interaction.response.send_message("Vous ne participez pas à ce combat!", ephemeral=True)
-                return
+    return embed
 
-            await interaction.response.defer()
-            await bloodlust_action(ctx, session, interaction.user.id)
+async def show_combat_status(ctx, session):
+    """Afficher le statut actuel du combat"""
 
-        @discord.ui.button(label="Forfait", style=discord.ButtonStyle.secondary, emoji="🏳️")
-        async def forfeit_button(self, button: discord.ui.Button, interaction: discord.Interaction):
-            if interaction.user.id not in [session.player1_id, session.player2_id]:
-                await interaction.response.send_message("Vous ne participez pas à ce combat!", ephemeral=True)
-                return
+    if not isinstance(ctx, CoalescingContext):
+        async with outbound.coalesce(ctx) as buffered:
+            await show_combat_status(buffered, session)
+        return
 
-            await interaction.response.defer()
-            winner_id = session.get_opponent_id(interaction.user.id)
-            await interaction.followup.send(f"🏳️ **{interaction.user.display_name}** abandonne le combat!")
-            await end_combat(ctx, session, winner_id)
+    # L'état est figé maintenant ; le tableau est modifié à la sortie du bloc, avec les messages de l'action
+    new_view = session.view is None
+    if new_view:
+        session.view = CombatView(session)
+    ctx.show_board(session, build_combat_embed(session), attach_view=new_view)
+
+async def publish_board(session, update: BoardUpdate):
+    """Envoyer une modification du tableau : état du combat et messages des actions en une requête.
+
+    Le premier affichage crée le message du combat, les suivants le modifient
+    sur place. Le jeton du canal est déjà pris par OutboundDispatcher.
+    """
+    ctx = update.ctx
+    # Une place est gardée pour l'état du combat dans le premier message
+    messages = pack_messages(update.contents, update.embeds, MAX_EMBEDS_PER_MESSAGE - 1)
+    content, embeds = messages[0]
+    if update.board is not None:
+        embeds = [update.board] + embeds
+
+    fields = {"content": content, "embeds": embeds} if content or embeds else {}
+    if update.close:
+        fields["view"] = None
+    elif update.attach_view:
+        # Vue recréée (redémarrage) : la rattacher aux boutons du message existant
+        fields["view"] = session.view
+
+    token_used = False
+    if session.board_message_id is not None and fields:
+        token_used = True
+        try:
+            await ctx.channel.get_partial_message(session.board_message_id).edit(**fields)
+        except discord.NotFound:
+            session.board_message_id = None
+
+    if session.board_message_id is None and (content or embeds):
+        if token_used:
+            await outbound.throttle(session.channel_id)
+        view = None if update.close else session.view
+        message = await ctx.followup.send(content, embeds=embeds, **({"view": view} if view is not None else {}))
+        if not update.close:
+            session.board_message_id = message.id
+
+    for content, embeds in messages[1:]:
+        await outbound.throttle(session.channel_id)
+        await ctx.followup.send(content, embeds=embeds)
+
+    # Chaque nouvel état affiché est journalisé pour survivre à un redémarrage
+    if not update.close and not session.finished:
+        await combat_journal.record(session)
+
+async def close_combat_board(ctx, session):
+    """Arrêter la vue du combat et retirer ses boutons du message"""
+    if not isinstance(ctx, CoalescingContext):
+        async with outbound.coalesce(ctx) as buffered:
+            await close_combat_board(buffered, session)
+        return
 
-    await ctx.followup.send(embed=embed, view=CombatView())
+    if session.view is not None:
+        session.view.stop()
+        session.view = None
+    ctx.close_board(session)
 
 # Actions de combat (fonctions helpers)
 async def basic_attack_action(ctx, session, user_id):
-    attacker = session.get_character(user_id)
-    defender = session.get_opponent_character(user_id)
+    attacker = session.get_fighter(user_id)
+    defender = session.get_opponent_fighter(user_id)
 
     if attacker.skip_next_turn:
         attacker.skip_next_turn = False
@@ -961,14 +3241,7 @@ async def basic_attack_action(ctx, session, user_id):
         await ctx.followup.send(f"🔥 **{attacker.name}** en bloodlust agit de manière imprévisible!")
         # Action aléatoire simplifiée
 
-    damage = combat_system.calculate_damage(attacker, defender)
-
-    heal_amount = 0
-    if attacker.bloodlust_turns > 0 and random.random() < 0.3:
-        heal_amount = int(damage * 0.25)
-        attacker.hp = min(attacker.max_hp, attacker.hp + heal_amount)
-
-    defender.hp = max(0, defender.hp - damage)
+    damage, heal_amount = combat_system.apply_attack(attacker, defender)
 
     attack_msg = f"⚔️ **{attacker.name}** attaque **{defender.name}** pour **{damage}** dégâts!"
     if heal_amount > 0:
@@ -984,7 +3257,7 @@ async def basic_attack_action(ctx, session, user_id):
     await end_turn(ctx, session)
 
 async def defense_action_handler(ctx, session, user_id):
-    character = session.get_character(user_id)
+    character = session.get_fighter(user_id)
 
     if character.skip_next_turn:
         character.skip_next_turn = False
@@ -1002,7 +3275,7 @@ async def defense_action_handler(ctx, session, user_id):
     await end_turn(ctx, session)
 
 async def bloodlust_action(ctx, session, user_id):
-    character = session.get_character(user_id)
+    character = session.get_fighter(user_id)
 
     if character.power_gauge > 0:
         await ctx.followup.send("Vous ne pouvez entrer en bloodlust qu'avec une jauge de pouvoir vide!")
@@ -1020,9 +3293,7 @@ async def bloodlust_action(ctx, session, user_id):
         await end_combat(ctx, session, opponent_id)
         return
 
-    character.bloodlust_turns = 8
-    character.power_gauge = 100.0
-    character.was_in_bloodlust = True
+    combat_system.activate_bloodlust(character)
 
     bloodlust_embed = discord.Embed(
         title="🔥 BLOODLUST ACTIVÉ!",
@@ -1038,8 +3309,7 @@ async def bloodlust_action(ctx, session, user_id):
     await show_combat_status(ctx, session)
 
 async def end_turn(ctx, session):
-    current_char = session.get_character(session.current_turn)
-    combat_system.process_turn_end(current_char)
+    combat_system.process_turn_end(session.get_fighter(session.current_turn))
 
     session.current_turn = session.get_opponent_id(session.current_turn)
     session.turn_count += 1
@@ -1047,73 +3317,79 @@ async def end_turn(ctx, session):
     await show_combat_status(ctx, session)
 
 async def end_combat(ctx, session, winner_id: int):
-    winner = bot.get_user(winner_id)
+    session.finished = True
+    winner_name = session.get_player_name(winner_id)
     loser_id = session.get_opponent_id(winner_id)
-    loser = bot.get_user(loser_id)
+    loser_name = session.get_player_name(loser_id)
 
     winner_char = session.get_character(winner_id)
     loser_char = session.get_character(loser_id)
+    winner_fighter = session.get_fighter(winner_id)
+    loser_fighter = session.get_fighter(loser_id)
 
     winner_exp = combat_system.calculate_experience(
-        winner_char, 1000 - loser_char.hp, True, 
-        winner_char.hp, winner_char.power_gauge
+        winner_char, 1000 - loser_fighter.hp, True,
+        winner_fighter.hp, winner_fighter.power_gauge
     )
     loser_exp = combat_system.calculate_experience(
-        loser_char, 1000 - winner_char.hp, False,
-        loser_char.hp, loser_char.power_gauge
+        loser_char, 1000 - winner_fighter.hp, False,
+        loser_fighter.hp, loser_fighter.power_gauge
     )
 
     winner_char.experience += winner_exp
     loser_char.experience += loser_exp
 
-    winner_leveled = winner_char.can_level_up()
-    loser_leveled = loser_char.can_level_up()
-
-    if winner_leveled:
-        winner_char.level_up()
-    if loser_leveled:
-        loser_char.level_up()
+    winner_leveled = winner_char.level_up()
+    loser_leveled = loser_char.level_up()
 
     winner_char.hp = winner_char.max_hp
     winner_char.power_gauge = 100.0
     loser_char.hp = loser_char.max_hp
     loser_char.power_gauge = 100.0
 
-    db.update_character(winner_char)
-    db.update_character(loser_char)
+    character_cache.update_progress(winner_char)
+    character_cache.update_progress(loser_char)
+    leaderboard_service.update(winner_char)
+    leaderboard_service.update(loser_char)
 
     end_embed = discord.Embed(
         title="🏆 Fin du Combat!",
-        description=f"**{winner.display_name}** remporte la victoire!",
+        description=f"**{winner_name}** remporte la victoire!",
         color=0xffd700
     )
 
     end_embed.add_field(
-        name=f"🎉 {winner.display_name}",
+        name=f"🎉 {winner_name}",
         value=f"**{winner_exp}** XP gagnés" + (f"\n📈 **NIVEAU UP!** Niveau {winner_char.level}" if winner_leveled else ""),
         inline=True
     )
 
     end_embed.add_field(
-        name=f"😔 {loser.display_name}",
+        name=f"😔 {loser_name}",
         value=f"**{loser_exp}** XP gagnés" + (f"\n📈 **NIVEAU UP!** Niveau {loser_char.level}" if loser_leveled else ""),
         inline=True
     )
 
     await ctx.followup.send(embed=end_embed)
 
-    del combat_system.active_combats[ctx.channel.id]
+    session_registry.complete(session)
+    await combat_journal.clear(session.session_id)
+    await close_combat_board(ctx, session)
 
 # Commandes slash pour les compétences
 @bot.slash_command(name="competence", description="Utiliser une compétence en combat")
-async def use_skill_command(ctx, nom_competence: str):
+async def use_skill_command(ctx, nom_competence: discord.Option(str, autocomplete=skill_name_autocomplete)):
     """Utiliser une compétence"""
 
-    if ctx.channel.id not in combat_system.active_combats:
+    await combat_journal.ready.wait()
+    session = session_registry.get_for_player(ctx.author.id)
+    if session is None:
         await ctx.respond("Aucun combat en cours!")
         return
 
-    session = combat_system.active_combats[ctx.channel.id]
+    if session.channel_id != ctx.channel.id:
+        await ctx.respond(f"Votre combat se déroule dans <#{session.channel_id}>!")
+        return
 
     if not session.combat_started:
         await ctx.respond("Le combat n'a pas encore commencé!")
@@ -1123,34 +3399,56 @@ async def use_skill_command(ctx, nom_competence: str):
         await ctx.respond("Ce n'est pas votre tour!")
         return
 
-    attacker = session.get_character(ctx.author.id)
-    defender = session.get_opponent_character(ctx.author.id)
+    if ctx.author.id in session.pending_actions:
+        await ctx.respond("⏳ Votre action précédente est encore en cours!", ephemeral=True)
+        return
+
+    session.pending_actions.add(ctx.author.id)
+    session.touch()
+    try:
+        if session.lock.locked():
+            await ctx.defer()
+        buffered = outbound.coalesce(ctx)
+        async with session.lock:
+            # L'état a pu changer pendant l'attente (clic sur un bouton en parallèle)
+            if not session.can_act(ctx.author.id):
+                await ctx.respond("Action ignorée : le combat a déjà avancé!", ephemeral=True)
+                return
+            await skill_action(ctx, buffered, session, nom_competence)
+        # Le tableau est modifié hors du verrou, comme pour les boutons
+        await buffered.flush()
+    finally:
+        session.pending_actions.discard(ctx.author.id)
+
+async def skill_action(ctx, buffered, session, nom_competence: str):
+    """Appliquer une compétence : les réponses passent par ctx, le tableau par le contexte `buffered`"""
+    attacker = session.get_fighter(ctx.author.id)
+    defender = session.get_opponent_fighter(ctx.author.id)
 
     if attacker.skip_next_turn:
         attacker.skip_next_turn = False
         await ctx.respond(f"**{attacker.name}** doit sauter ce tour à cause d'une compétence restreinte!")
-        await end_turn(ctx, session)
+        await end_turn(buffered, session)
         return
 
-    skill = None
-    for s in attacker.skills:
-        if s.name.lower() == nom_competence.lower():
-            skill = s
-            break
-
-    if not skill:
+    index = attacker.skill_index.get(nom_competence.casefold())
+    if index is None and is_choice_reference(nom_competence):
+        name = resolve_choice(nom_competence, (skill.name for skill in attacker.skills))
+        index = attacker.skill_index.get(name.casefold())
+    if index is None:
         await ctx.respond(f"Compétence **{nom_competence}** non trouvée!")
         return
+    skill = attacker.skills[index]
 
-    if skill.cooldown > 0:
-        await ctx.respond(f"**{skill.name}** est en cooldown ({skill.cooldown} tours restants)!")
+    if attacker.skill_cooldowns[index] > 0:
+        await ctx.respond(f"**{skill.name}** est en cooldown ({attacker.skill_cooldowns[index]} tours restants)!")
         return
 
     if attacker.power_gauge < skill.get_power_cost():
         await ctx.respond(f"Jauge de pouvoir insuffisante! (**{skill.get_power_cost()}%** requis)")
         return
 
-    combat_system.use_skill(attacker, skill, defender)
+    combat_system.use_skill(attacker, index, defender)
 
     skill_msg = f"✨ **{attacker.name}** utilise **{skill.name}**!"
 
@@ -1158,13 +3456,7 @@ async def use_skill_command(ctx, nom_competence: str):
     heal_amount = 0
 
     if skill.category in [SkillCategory.ATTAQUE, SkillCategory.RESTREINTE]:
-        damage = combat_system.calculate_damage(attacker, defender, True, skill.category)
-
-        if attacker.bloodlust_turns > 0 and random.random() < 0.3:
-            heal_amount = int(damage * 0.25)
-            attacker.hp = min(attacker.max_hp, attacker.hp + heal_amount)
-
-        defender.hp = max(0, defender.hp - damage)
+        damage, heal_amount = combat_system.apply_attack(attacker, defender, True, skill.category)
         skill_msg += f"\n💥 **{damage}** dégâts infligés!"
 
     if skill.category == SkillCategory.BONUS:
@@ -1181,10 +3473,10 @@ async def use_skill_command(ctx, nom_competence: str):
 
     winner_id = combat_system.check_victory_conditions(session)
     if winner_id:
-        await end_combat(ctx, session, winner_id)
+        await end_combat(buffered, session, winner_id)
         return
 
-    await end_turn(ctx, session)
+    await end_turn(buffered, session)
 
 # Autres commandes slash utilitaires
 @bot.slash_command(name="aide", description="Afficher toutes les commandes disponibles")
@@ -1218,49 +3510,93 @@ async def show_commands(ctx):
     await ctx.respond(embed=embed)
 
 @bot.slash_command(name="classement", description="Afficher le classement des personnages")
-async def leaderboard(ctx, critere: discord.Option(str, choices=["niveau", "experience"]) = "niveau"):
+async def leaderboard(ctx,
+                      critere: discord.Option(str, choices=["niveau", "experience"]) = "niveau",
+                      page: discord.Option(int, min_value=1) = 1,
+                      talent: discord.Option(str, choices=[t.value for t in Talent], required=False) = None,
+                      portee: discord.Option(str, choices=["global", "serveur"]) = "global"):
     """Afficher le classement des personnages"""
 
-    cursor = db.conn.cursor()
+    guild = ctx.guild if portee == "serveur" else None
+    if guild is not None and not guild.chunked:
+        # Premier classement de ce serveur : charger la liste complète de ses membres
+        await ctx.defer()
+        await guild.chunk()
+    owner_filter = (lambda owner_id: guild.get_member(owner_id) is not None) if guild else None
 
-    if critere == "niveau":
-        cursor.execute("""
-            SELECT name, owner_id, level, talent FROM characters 
-            ORDER BY level DESC, experience DESC LIMIT 10
-        """)
-        title = "🏆 Classement par Niveau"
-    else:
-        cursor.execute("""
-            SELECT name, owner_id, experience, talent FROM characters 
-            ORDER BY experience DESC LIMIT 10
-        """)
-        title = "✨ Classement par Expérience"
-
-    results = cursor.fetchall()
+    results, total_pages = await leaderboard_service.get_page(critere, page, talent, owner_filter)
+    page = min(page, total_pages)
 
     if not results:
         await ctx.respond("Aucun personnage trouvé!")
         return
 
-    embed = discord.Embed(title=title, color=0xffd700)
-
-    for i, (name, owner_id, value, talent) in enumerate(results, 1):
-        try:
-            user = bot.get_user(owner_id)
-            user_name = user.display_name if user else "Utilisateur inconnu"
-        except:
-            user_name = "Utilisateur inconnu"
+    cache_key = (page, talent, guild.id if guild else None)
+    embed = leaderboard_service.get_cached_embed(critere, cache_key)
+    if embed is None:
+        # Les profils absents du cache sont récupérés ensemble, en attendant au plus une seconde
+        names = await user_directory.resolve({entry.owner_id for _, entry in results})
+        title = "🏆 Classement par Niveau" if critere == "niveau" else "✨ Classement par Expérience"
+        if talent:
+            title += f" - {talent}"
+        if guild:
+            title += f" ({guild.name})"
+
+        embed = discord.Embed(title=title, color=0xffd700)
+
+        for i, entry in results:
+            user_name = names[entry.owner_id] or UNKNOWN_USER
+
+            medal = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else f"{i}."
+            value = entry.level if critere == "niveau" else entry.experience
+
+            embed.add_field(
+                name=f"{medal} {entry.name}",
+                value=f"**Joueur:** {user_name}\n**{critere.capitalize()}:** {value}\n**Talent:** {entry.talent}",
+                inline=False
+            )
 
-        medal = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else f"{i}."
-
-        embed.add_field(
-            name=f"{medal} {name}",
-            value=f"**Joueur:** {user_name}\n**{critere.capitalize()}:** {value}\n**Talent:** {talent}",
-            inline=False
-        )
+        embed.set_footer(text=f"Page {page}/{total_pages}")
+        # Une page avec des noms encore inconnus sera reconstruite au prochain appel
+        if all(names.values()):
+            leaderboard_service.store_embed(critere, cache_key, embed)
 
     await ctx.respond(embed=embed)
 
+def _latency_summary(family: Dict[Tuple, Histogram], label: str, limit: int = 10) -> str:
+    """Lignes « nom : appels, moyenne, p95 » triées par temps total décroissant"""
+    rows = sorted(family.items(), key=lambda item: -item[1].sum)[:limit]
+    lines = [f"`{dict(key).get(label, '?')}` : {h.count} appels, moy. {h.sum / h.count * 1000:.1f} ms, "
+             f"p95 ≤ {h.quantile(0.95) * 1000:g} ms"
+             for key, h in rows if h.count]
+    return "\n".join(lines) or "Aucune mesure"
+
+@bot.slash_command(name="metriques", description="Afficher les métriques de performance du bot",
+                   default_member_permissions=discord.Permissions(administrator=True))
+async def show_metrics(ctx):
+    """Afficher les métriques de performance du bot (administrateurs)"""
+
+    embed = discord.Embed(title="📈 Métriques du bot", color=0x2f3136)
+    embed.add_field(name="⌨️ Commandes", value=_latency_summary(metrics.histograms("rpg_command_seconds"), "command"),
+                    inline=False)
+    embed.add_field(name="🗄️ Base de données",
+                    value=_latency_summary(metrics.histograms("rpg_db_query_seconds"), "method", limit=5), inline=False)
+
+    sessions = session_registry.metrics()
+    embed.add_field(name="⚔️ Combats",
+                    value=f"{sessions['live']} en cours sur {sessions['channels']} canal(aux)\n"
+                          f"{sessions['completed']} terminés, {sessions['expired']} expirés",
+                    inline=True)
+    embed.add_field(name="🔁 Boucle asyncio", value=f"Retard : {metrics.loop_lag * 1000:.1f} ms", inline=True)
+    embed.add_field(name="📨 Envois", value=f"{outbound.queue_depth()} en attente", inline=True)
+
+    blocks = "\n".join(f"`{site}` : {count}" for site, count in watchdog.blocks.most_common(5))
+    embed.add_field(name="🐢 Blocages de la boucle",
+                    value=(blocks + f"\nPlus long : {watchdog.longest * 1000:.0f} ms") if blocks else "Aucun",
+                    inline=False)
+
+    await ctx.respond(embed=embed, ephemeral=True)
+
 if __name__ == "__main__":
     print("🚀 Démarrage du Bot RPG Discord avec commandes slash...")
     print("📝 N'oubliez pas de remplacer 'VOTRE_TOKEN_ICI' par votre vrai token Discord!")
@@ -1272,3 +3608,8 @@ if __name__ == "__main__":
         print("❌ Erreur de connexion: Token Discord invalide!")
     except Exception as e:
         print(f"❌ Erreur lors du démarrage: {e}")
+    finally:
+        # La boucle du bot est fermée : écrire les dernières modifications sur une nouvelle boucle
+        asyncio.run(character_cache.flush())
+        write_warm_snapshot(leaderboard_service, character_cache)
+        db.close()
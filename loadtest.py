@@ -0,0 +1,167 @@
+"""Test de charge hors ligne des commandes du bot.
+
+Joue des milliers de duels simultanés dans un seul processus, sans réseau ni
+jeton : /defier, /choisir_personnage, les menus d'objectif et de
+pierre-feuille-ciseaux puis les boutons de combat jusqu'à end_combat. Les
+commandes reçoivent les contextes et interactions de substitution de
+cluster.py, et les joueurs simulés de FakeDiscord répondent à chaque message
+envoyé. Mesure le débit, la latence de chaque gestionnaire (p50/p99) et le
+nombre d'appels sortants vers Discord.
+
+    python loadtest.py --duels 2000 --concurrency 1000 --json charge.json
+"""
+
+import os
+
+# Base en mémoire par défaut : le test ne touche pas aux vrais personnages
+os.environ.setdefault('RPG_DB_PATH', ':memory:')
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+from typing import Dict, List
+
+from cluster import CombatWorker, FakeDiscord, InteractionEvent, RelayChannel, create_fake_players
+
+class LoadTestWorker(CombatWorker):
+    """Worker exécuté dans le processus du test : services du bot locaux, Discord simulé.
+
+    Il sert aussi de frontal à FakeDiscord : chaque interaction routée est
+    traitée dans sa propre tâche, chronométrée de bout en bout.
+    """
+
+    def __init__(self, transport: FakeDiscord, max_sessions: int, throttle: bool = True):
+        super().__init__(0, 1, None, None, throttle)
+        self.transport = transport
+        self.max_sessions = max_sessions
+        self.outbound_calls: Counter = Counter()
+        self.latencies: Dict[str, List[float]] = {}
+        self._tasks = set()
+
+    def notify(self, target: str, method: str, *args):
+        # Pas de frontal séparé : les notifications n'ont pas de destinataire
+        pass
+
+    async def call(self, target: str, method: str, *args, **kwargs):
+        # Seuls les appels vers Discord sortent du bot : le reste est local
+        self.outbound_calls[method] += 1
+        return await getattr(self.transport, method)(*args, **kwargs)
+
+    def _install(self):
+        import discord_rpg_bot_complet as rpg
+
+        rpg.session_registry = rpg.SessionRegistry(max_sessions=max(rpg.MAX_SESSIONS, self.max_sessions))
+        rpg.session_registry.on_expire = rpg.expire_combat
+        if not self.throttle:
+            rpg.outbound = rpg.OutboundDispatcher(capacity=10**9)
+        rpg.bot.get_channel = lambda channel_id: RelayChannel(self, channel_id)
+
+        self.rpg = rpg
+        self.commands = {
+            "defier": rpg.challenge_player,
+            "choisir_personnage": rpg.choose_character,
+            "competence": rpg.use_skill_command,
+        }
+
+    def _handler_name(self, event: InteractionEvent) -> str:
+        if event.kind == "commande":
+            return f"/{event.name}"
+        view = self._views.get(event.message_id)
+        view_name = type(view).__name__ if view is not None else "vue expirée"
+        if event.custom_id.startswith("rpg_combat:"):
+            return f"{view_name} {event.custom_id.split(':', 1)[1]}"
+        return view_name
+
+    def route(self, event: InteractionEvent):
+        task = asyncio.get_running_loop().create_task(self._timed_handle(event))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _timed_handle(self, event: InteractionEvent):
+        name = self._handler_name(event)
+        start = time.perf_counter()
+        await self.handle(event)
+        self.latencies.setdefault(name, []).append(time.perf_counter() - start)
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+async def run_load_test(duels: int, concurrency: int, seed: int, throttle: bool = True,
+                        timeout: float = 300.0) -> Dict:
+    """Jouer `duels` combats complets, au plus `concurrency` à la fois"""
+    transport = FakeDiscord(seed)
+    worker = LoadTestWorker(transport, concurrency, throttle)
+    transport.front = worker
+    worker._install()
+    rpg = worker.rpg
+
+    await create_fake_players(rpg, transport, 2 * duels)
+    rpg.character_cache.start()
+    rpg.session_registry.start()
+    await rpg.combat_journal.restore(rpg.session_registry, rpg.bot, rpg.user_directory)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    channel_ids = random.Random(seed).sample(range(10**17, 10**18), duels)
+
+    async def one(index: int) -> bool:
+        async with semaphore:
+            return await transport.play_duel(channel_ids[index], 2 * index + 1, 2 * index + 2, timeout)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one(index) for index in range(duels)))
+    elapsed = time.perf_counter() - start
+    await rpg.character_cache.flush()
+
+    handlers = {}
+    for name, values in sorted(worker.latencies.items()):
+        values.sort()
+        handlers[name] = {
+            "calls": len(values),
+            "p50_ms": percentile(values, 0.50) * 1000,
+            "p99_ms": percentile(values, 0.99) * 1000,
+            "max_ms": values[-1] * 1000,
+        }
+
+    return {
+        "duels": duels,
+        "completed": sum(results),
+        "concurrency": concurrency,
+        "seconds": elapsed,
+        "interactions": worker.handled,
+        "handlers": handlers,
+        "outbound": dict(worker.outbound_calls),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Tester la charge du bot RPG sans connexion Discord")
+    parser.add_argument("--duels", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=1000, help="Duels simultanés")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=300.0, help="Délai maximal d'un duel, en secondes")
+    parser.add_argument("--no-throttle", action="store_true",
+                        help="Sans limite d'envoi par canal, pour mesurer le coût des gestionnaires seuls")
+    parser.add_argument("--json", help="Écrire les résultats dans ce fichier JSON")
+    args = parser.parse_args()
+
+    results = asyncio.run(run_load_test(args.duels, args.concurrency, args.seed, not args.no_throttle, args.timeout))
+
+    completed, seconds = results["completed"], results["seconds"]
+    print(f"⚔️ {completed}/{results['duels']} duels en {seconds:.2f}s ({completed / seconds:,.1f} duels/s, "
+          f"{results['interactions'] / seconds:,.0f} interactions/s), {results['concurrency']} simultanés")
+    print(f"{'Gestionnaire':<28} {'appels':>8} {'p50':>10} {'p99':>10} {'max':>10}")
+    for name, stats in results["handlers"].items():
+        print(f"{name:<28} {stats['calls']:>8} {stats['p50_ms']:>8.2f}ms {stats['p99_ms']:>8.2f}ms "
+              f"{stats['max_ms']:>8.2f}ms")
+    outbound = results["outbound"]
+    print(f"📨 {sum(outbound.values())} appels sortants ({sum(outbound.values()) / max(1, completed):.1f} par duel) : "
+          + ", ".join(f"{method} {count}" for method, count in sorted(outbound.items())))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
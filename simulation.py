@@ -0,0 +1,270 @@
+"""Simulation de combats hors Discord pour l'équilibrage.
+
+Rejoue la boucle de tour des boutons de combat (attaque, défense, bloodlust,
+/competence) sur les règles de CombatSystem, sans bot ni base de données, et
+lance des millions de duels reproductibles sur un pool de processus.
+
+    python simulation.py --duels 1000000 --workers 8 --seed 42 --json resultats.json
+"""
+
+import os
+
+# Le module du bot ouvre sa base à l'import : une base en mémoire suffit ici
+os.environ.setdefault('RPG_DB_PATH', ':memory:')
+
+import argparse
+import json
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from discord_rpg_bot_complet import (
+    Character, CombatSession, CombatSystem, Fighter, ObjectifVictoire, Skill, SkillCategory, Talent
+)
+
+MAX_TURNS = 200  # Au-delà, le duel est déclaré nul
+SKILLS_PER_CHARACTER = 2
+PLAYER_IDS = (1, 2)  # check_victory_conditions renvoie un identifiant : 0 serait faux
+
+# Actions proposées par une politique
+ATTACK = "attaque"
+DEFENSE = "defense"
+SKILL = "competence"
+BLOODLUST = "bloodlust"
+
+Action = Tuple  # (ATTACK,), (DEFENSE,), (SKILL, indice_compétence) ou (BLOODLUST,)
+Policy = Callable[[CombatSession, int, random.Random], Action]
+
+engine = CombatSystem()
+
+@dataclass
+class SimulationResult:
+    winner: Optional[int]  # 0 ou 1 (indice du personnage), None en cas de nul
+    turns: int
+
+def can_enter_bloodlust(character: Fighter) -> bool:
+    return character.power_gauge <= 0 and character.bloodlust_turns == 0
+
+def get_objective(session: CombatSession, player_id: int) -> ObjectifVictoire:
+    return session.player1_objective if player_id == session.player1_id else session.player2_objective
+
+def legal_actions(session: CombatSession, player_id: int) -> List[Action]:
+    character = session.get_fighter(player_id)
+    actions = [(ATTACK,)]
+    if character.defense_cooldown == 0:
+        actions.append((DEFENSE,))
+    for index, skill in enumerate(character.skills):
+        if character.skill_cooldowns[index] == 0 and character.power_gauge >= skill.get_power_cost():
+            actions.append((SKILL, index))
+    if can_enter_bloodlust(character):
+        actions.append((BLOODLUST,))
+    return actions
+
+# Politiques de jeu
+def random_policy(session: CombatSession, player_id: int, rng: random.Random) -> Action:
+    """Choisir uniformément parmi les actions autorisées"""
+    return rng.choice(legal_actions(session, player_id))
+
+def greedy_policy(session: CombatSession, player_id: int, rng: random.Random) -> Action:
+    """Bloodlust dès que possible (sauf si c'est l'objectif adverse), puis compétences, puis attaque"""
+    character = session.get_fighter(player_id)
+    opponent_objective = get_objective(session, session.get_opponent_id(player_id))
+
+    if can_enter_bloodlust(character) and opponent_objective != ObjectifVictoire.VIDER_POUVOIR:
+        return (BLOODLUST,)
+
+    ready = [action for action in legal_actions(session, player_id) if action[0] == SKILL]
+    if ready:
+        return max(ready, key=lambda action: character.skills[action[1]].category == SkillCategory.ATTAQUE)
+    return (ATTACK,)
+
+POLICIES: Dict[str, Policy] = {
+    "random": random_policy,
+    "greedy": greedy_policy,
+}
+
+def _end_turn(session: CombatSession):
+    engine.process_turn_end(session.get_fighter(session.current_turn))
+    session.current_turn = session.get_opponent_id(session.current_turn)
+    session.turn_count += 1
+
+def simulate_combat(char1: Character, char2: Character, obj1: ObjectifVictoire, obj2: ObjectifVictoire,
+                    policy: Policy, rng: random.Random, max_turns: int = MAX_TURNS) -> SimulationResult:
+    """Jouer un duel complet avec les mêmes règles que les commandes du bot.
+
+    Une action refusée par le bot (compétence indisponible, défense en
+    recharge, bloodlust impossible) est remplacée par une attaque basique,
+    ce qui revient à ce que le joueur choisisse l'attaque ensuite. Le
+    bloodlust n'est proposé qu'au joueur dont c'est le tour.
+    """
+    session = CombatSession(PLAYER_IDS[0], PLAYER_IDS[1], 0)
+    session.player1_character = char1
+    session.player2_character = char2
+    session.prepare_combat()
+    session.player1_objective = obj1
+    session.player2_objective = obj2
+    session.current_turn = rng.choice(PLAYER_IDS)  # Pierre-feuille-ciseaux
+    session.turn_count = 1
+    session.combat_started = True
+
+    while session.turn_count <= max_turns:
+        player_id = session.current_turn
+        attacker = session.get_fighter(player_id)
+        defender = session.get_opponent_fighter(player_id)
+        action = policy(session, player_id, rng)
+        kind = action[0]
+
+        if kind == BLOODLUST:
+            if can_enter_bloodlust(attacker):
+                opponent_id = session.get_opponent_id(player_id)
+                if get_objective(session, opponent_id) == ObjectifVictoire.VIDER_POUVOIR:
+                    return SimulationResult(PLAYER_IDS.index(opponent_id), session.turn_count)
+                engine.activate_bloodlust(attacker)
+                continue  # Le bloodlust ne termine pas le tour
+            kind = ATTACK
+
+        if attacker.skip_next_turn:
+            attacker.skip_next_turn = False
+            _end_turn(session)
+            continue
+
+        if kind == DEFENSE and attacker.defense_cooldown == 0:
+            attacker.defending = True
+            _end_turn(session)
+            continue
+
+        skill = attacker.skills[action[1]] if kind == SKILL else None
+        if skill is not None and engine.use_skill(attacker, action[1], defender):
+            if skill.category in (SkillCategory.ATTAQUE, SkillCategory.RESTREINTE):
+                engine.apply_attack(attacker, defender, True, skill.category, rng)
+        else:
+            engine.apply_attack(attacker, defender, rng=rng)
+
+        winner_id = engine.check_victory_conditions(session)
+        if winner_id:
+            return SimulationResult(PLAYER_IDS.index(winner_id), session.turn_count)
+
+        _end_turn(session)
+
+    return SimulationResult(None, max_turns)
+
+# Tirage des duels et agrégation des résultats
+def random_character(owner_id: int, rng: random.Random) -> Character:
+    skills = [Skill(name=f"Compétence {i + 1}", effect="", category=rng.choice(list(SkillCategory)))
+              for i in range(SKILLS_PER_CHARACTER)]
+    return Character(name=f"Combattant {owner_id}", owner_id=owner_id,
+                     talent=rng.choice(list(Talent)), skills=skills)
+
+def loadout_key(character: Character) -> str:
+    return "+".join(sorted(skill.category.value for skill in character.skills))
+
+def _record(table: Dict, key, won: bool, draw: bool):
+    stats = table.setdefault(key, [0, 0, 0])  # [parties, victoires, nuls]
+    stats[0] += 1
+    stats[1] += won
+    stats[2] += draw
+
+def run_chunk(seed: int, duels: int, policy_name: str, max_turns: int = MAX_TURNS) -> Dict:
+    """Jouer `duels` combats tirés avec la graine donnée et agréger leurs résultats"""
+    rng = random.Random(seed)
+    policy = POLICIES[policy_name]
+    objectives = list(ObjectifVictoire)
+    results = {"duels": 0, "turns": 0, "draws": 0, "matchups": {}, "objectives": {}, "loadouts": {}}
+
+    for _ in range(duels):
+        characters = (random_character(PLAYER_IDS[0], rng), random_character(PLAYER_IDS[1], rng))
+        chosen = (rng.choice(objectives), rng.choice(objectives))
+        result = simulate_combat(characters[0], characters[1], chosen[0], chosen[1], policy, rng, max_turns)
+
+        results["duels"] += 1
+        results["turns"] += result.turns
+        results["draws"] += result.winner is None
+
+        for side in (0, 1):
+            other = 1 - side
+            won = result.winner == side
+            draw = result.winner is None
+            _record(results["matchups"], (characters[side].talent.value, characters[other].talent.value), won, draw)
+            _record(results["objectives"], (chosen[side].name, chosen[other].name), won, draw)
+            _record(results["loadouts"], loadout_key(characters[side]), won, draw)
+
+    return results
+
+def merge_results(total: Dict, part: Dict) -> Dict:
+    for counter in ("duels", "turns", "draws"):
+        total[counter] = total.get(counter, 0) + part[counter]
+    for table in ("matchups", "objectives", "loadouts"):
+        merged = total.setdefault(table, {})
+        for key, stats in part[table].items():
+            current = merged.setdefault(key, [0, 0, 0])
+            for i, value in enumerate(stats):
+                current[i] += value
+    return total
+
+def run_batch(duels: int, seed: int = 0, policy_name: str = "greedy", workers: Optional[int] = None,
+              chunk_size: int = 10000, max_turns: int = MAX_TURNS) -> Dict:
+    """Répartir les duels en lots de graines dérivées de `seed` sur un pool de processus"""
+    chunks = [(seed * 1_000_003 + index, min(chunk_size, duels - start), policy_name, max_turns)
+              for index, start in enumerate(range(0, duels, chunk_size))]
+
+    total = {}
+    if workers == 1:
+        for chunk in chunks:
+            merge_results(total, run_chunk(*chunk))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for part in executor.map(run_chunk, *zip(*chunks)):
+                merge_results(total, part)
+    return total
+
+def format_table(title: str, table: Dict) -> str:
+    lines = [title]
+    for key, (games, wins, draws) in sorted(table.items(), key=lambda item: -item[1][1] / item[1][0]):
+        label = " vs ".join(key) if isinstance(key, tuple) else key
+        lines.append(f"  {label:<45} {wins / games:6.1%} victoires  {draws / games:5.1%} nuls  ({games} parties)")
+    return "\n".join(lines)
+
+def to_json(results: Dict) -> Dict:
+    def rows(table):
+        return [{"key": list(key) if isinstance(key, tuple) else key,
+                 "games": games, "wins": wins, "draws": draws, "win_rate": wins / games}
+                for key, (games, wins, draws) in sorted(table.items())]
+
+    return {
+        "duels": results["duels"],
+        "draws": results["draws"],
+        "average_turns": results["turns"] / max(1, results["duels"]),
+        "matchups": rows(results["matchups"]),
+        "objectives": rows(results["objectives"]),
+        "loadouts": rows(results["loadouts"]),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Simuler des duels pour équilibrer talents et compétences")
+    parser.add_argument("--duels", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="greedy")
+    parser.add_argument("--workers", type=int, default=None, help="Processus (défaut : un par cœur)")
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--max-turns", type=int, default=MAX_TURNS)
+    parser.add_argument("--json", help="Écrire les résultats dans ce fichier JSON")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = run_batch(args.duels, args.seed, args.policy, args.workers, args.chunk_size, args.max_turns)
+    elapsed = time.perf_counter() - start
+
+    print(f"⚔️ {results['duels']} duels en {elapsed:.2f}s ({results['duels'] / elapsed:,.0f} duels/s), "
+          f"{results['turns'] / results['duels']:.1f} tours en moyenne, {results['draws']} nuls")
+    print(format_table("🎯 Talents", results["matchups"]))
+    print(format_table("🏁 Objectifs", results["objectives"]))
+    print(format_table("🎪 Compétences", results["loadouts"]))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(to_json(results), f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()